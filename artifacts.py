@@ -0,0 +1,215 @@
+"""Process-wide cache for the trained model and scaler.
+
+Streamlit re-executes ``app.py`` on every interaction, but imported modules
+stay in ``sys.modules`` for the lifetime of the server process.  Keeping the
+unpickled artifacts here means each file is read once per process and shared
+by every session.
+
+The files are re-checked at most every ``check_interval`` seconds.  When the
+mtime or size changes the content hash is recomputed, and only a real content
+change triggers a reload.  A new model and scaler are loaded together and
+swapped in with a single reference assignment, so a session that already
+holds a bundle keeps using a consistent model/scaler pair until its next
+rerun.  ``train_model.publish`` replaces the two pickles one after the other
+and first writes the version of the new pair to ``model.json`` beside the
+model; while the files on disk do not make up that version the current
+bundle is kept and the files are checked again.
+
+A ``.forest`` model path loads the memory-mapped ``CompiledForest`` written
+by ``export_model.py`` instead of unpickling anything.  Its bundle has no
+separate scaler, and its version is the version of the pickles it was
+exported from, so artifacts built for that version (such as the prediction
+table) still apply.  The pickles it was exported from (``model.pkl`` next to
+it, and the scaler path) are watched too: when they change to a pair the
+compiled model was not exported from, a warning says it is stale until
+``export_model.py`` is re-run.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+# Compiled models (see export_model.py) carry the scaler folded in
+COMPILED_SUFFIX = '.forest'
+
+# Default artifact locations, overridable for deployments; a compiled model is preferred
+MODEL_PATH = os.environ.get('DYSLEXIA_MODEL_PATH') or \
+    ('model.forest' if os.path.exists('model.forest') else 'model.pkl')
+SCALER_PATH = os.environ.get('DYSLEXIA_SCALER_PATH', 'scaler.pkl')
+
+logger = logging.getLogger(__name__)
+
+# A loaded model/scaler pair and the content hash identifying it
+ModelBundle = namedtuple('ModelBundle', ['model', 'scaler', 'version', 'loaded_at'])
+
+
+def file_digest(path, chunk_size=1 << 20):
+    # SHA-256 of the file content, read in chunks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def pair_version(paths):
+    # Combined hash of the files, shortened for display
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()[:16]
+
+
+class ArtifactCache:
+    """Loads the model/scaler pair once and hot-swaps it when the files change."""
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, check_interval=2.0):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.compiled = model_path.endswith(COMPILED_SUFFIX)
+        self.check_interval = check_interval
+        self._bundle = None
+        self._stat = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._derived = {}
+        # The pickle pair a compiled model is exported from
+        self.source_paths = [os.path.splitext(model_path)[0] + '.pkl', scaler_path] if self.compiled else []
+        self._source_stat = None
+        # Version written by train_model.publish before it replaces the pickle pair
+        self.published_path = None if self.compiled else os.path.splitext(model_path)[0] + '.json'
+        self._unpublished = None
+
+    def add_listener(self, callback):
+        # callback(bundle) is invoked after every (re)load
+        self._listeners.append(callback)
+
+    def current(self):
+        """Return the current bundle, reloading first if the files changed."""
+        bundle = self._bundle
+        now = time.monotonic()
+        if bundle is not None and now - self._last_check < self.check_interval:
+            return bundle
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._bundle is not None and now - self._last_check < self.check_interval:
+                return self._bundle
+            self._last_check = now
+            stat = tuple(_stat_key(path) for path in self._paths())
+            if self._bundle is None or stat != self._stat:
+                version = self._version()
+                if self._bundle is not None and not self._published(version):
+                    # Half-way through a publish: keep the old pair and look again next time
+                    return self._bundle
+                if self._bundle is None or version != self._bundle.version:
+                    self._bundle = self._load(version)
+                    for callback in self._listeners:
+                        callback(self._bundle)
+                self._stat = stat
+            if self.source_paths:
+                self._check_sources()
+            return self._bundle
+
+    def derived(self, name, build, bundle=None):
+        """Return ``build(bundle)`` for the given (default: current) bundle, computed once per version."""
+        bundle = bundle or self.current()
+        key = (name, bundle.version)
+        if key not in self._derived:
+            value = build(bundle)
+            with self._lock:
+                # Drop values built for older versions
+                self._derived = {k: v for k, v in self._derived.items()
+                                 if k[1] == self._bundle.version}
+                self._derived[key] = value
+        return self._derived[key]
+
+    def reload(self):
+        """Force the next call to ``current`` to re-check the files."""
+        with self._lock:
+            self._last_check = 0.0
+            self._stat = None
+        return self.current()
+
+    def _check_sources(self):
+        # Warn once per change when the source pickles no longer match the compiled model
+        if not all(os.path.exists(path) for path in self.source_paths):
+            return
+        stat = tuple(_stat_key(path) for path in self.source_paths)
+        if stat == self._source_stat:
+            return
+        self._source_stat = stat
+        version = pair_version(self.source_paths)
+        if version != self._bundle.version:
+            logger.warning("%s is stale: it was exported from model version %s, but %s now hold version %s; "
+                           "re-run export_model.py to serve it", self.model_path, self._bundle.version,
+                           ' and '.join(self.source_paths), version)
+
+    def _published(self, version):
+        # Whether the pickle pair on disk is the one last published (or nothing says otherwise)
+        if not self.published_path or not os.path.exists(self.published_path):
+            return True
+        try:
+            with open(self.published_path) as f:
+                expected = json.load(f).get('version')
+        except (OSError, ValueError):
+            return True
+        if expected is None or expected == version:
+            self._unpublished = None
+            return True
+        if self._unpublished != version:
+            self._unpublished = version
+            logger.warning("%s and %s hold model version %s, but %s names version %s; "
+                           "keeping version %s until they match", self.model_path, self.scaler_path, version,
+                           self.published_path, expected, self._bundle.version)
+        return False
+
+    def _paths(self):
+        return [self.model_path] if self.compiled else [self.model_path, self.scaler_path]
+
+    def _version(self):
+        if self.compiled:
+            from forest_engine import read_header
+            version = read_header(self.model_path)['metadata'].get('model_version')
+            if version:
+                return version
+        return pair_version(self._paths())
+
+    def _load(self, version):
+        if self.compiled:
+            from forest_engine import CompiledForest
+            return ModelBundle(CompiledForest.load(self.model_path), None, version, time.time())
+        with open(self.model_path, 'rb') as model_file:
+            model = pickle.load(model_file)
+        with open(self.scaler_path, 'rb') as scaler_file:
+            scaler = pickle.load(scaler_file)
+        return ModelBundle(model, scaler, version, time.time())
+
+
+# Shared instance used by the app
+_cache = ArtifactCache()
+
+
+def current():
+    return _cache.current()
+
+
+def get_model():
+    return _cache.current().model
+
+
+def get_scaler():
+    return _cache.current().scaler
+
+
+def derived(name, build, bundle=None):
+    return _cache.derived(name, build, bundle)
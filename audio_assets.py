@@ -0,0 +1,264 @@
+"""Audio clips for the memory and audio discrimination tests.
+
+Build step (run once after changing the recordings):
+
+    python audio_assets.py build
+
+scans ``Audios_memory/``, normalises the loudness of every clip, writes
+compressed variants to ``Audios_memory/dist/`` and records each variant's
+size, duration and SHA-256 in ``Audios_memory/manifest.json``.  Compressed
+variants (Opus in Ogg and low-bitrate MP3) need ``ffmpeg`` on the PATH;
+without it only loudness-normalised WAV copies are produced.
+
+At runtime the app calls ``resolve(name)`` with a clip name such as
+``'audio_3'`` or ``'Bat_Pat'``.  The manifest is read once per process and
+paths are resolved against ``DYSLEXIA_AUDIO_ROOT`` (default: the
+``Audios_memory`` folder next to this file), so nothing touches the
+filesystem while a page is being rendered.
+
+Every variant also has a content-hashed name (``Bat_Pat.3f9c01d2a4b6.mp3``).
+When ``DYSLEXIA_MEDIA_URL`` is set, ``url_for(name)`` returns the clip's URL
+under that base, served by ``media_server.py`` (or a CDN in front of it) as
+an immutable static asset, and the app hands the URL to the browser instead
+of loading the file into Streamlit's per-session media store.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import wave
+
+import numpy as np
+
+from artifacts import file_digest
+
+# Where the clips live; relative paths are taken from this file's folder
+AUDIO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.environ.get('DYSLEXIA_AUDIO_ROOT', 'Audios_memory'))
+MANIFEST_NAME = 'manifest.json'
+DIST_DIR = 'dist'
+
+# Base URL of the static media server (see media_server.py); unset serves clips through Streamlit
+MEDIA_URL = os.environ.get('DYSLEXIA_MEDIA_URL')
+HASH_LENGTH = 12
+
+# Variant formats in order of preference when serving
+FORMAT_PREFERENCE = os.environ.get('DYSLEXIA_AUDIO_FORMATS', 'audio/mpeg,audio/ogg,audio/wav').split(',')
+
+# Target loudness for normalised clips
+TARGET_RMS_DBFS = -20.0
+PEAK_CEILING_DBFS = -1.0
+
+_mime_types = {'.wav': 'audio/wav', '.mp3': 'audio/mpeg', '.ogg': 'audio/ogg'}
+
+
+def wav_duration(path):
+    with wave.open(path, 'rb') as w:
+        return w.getnframes() / w.getframerate()
+
+
+# MPEG audio bitrates (kbps) by [version is MPEG-1][bitrate index], layer III
+_mp3_bitrates = {
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+
+def mp3_duration(path):
+    """Duration of a constant-bitrate MP3, from the first frame header."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    start = 0
+    if data[:3] == b'ID3':
+        # Skip the ID3v2 tag (size is a 28-bit syncsafe integer)
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size
+    for i in range(start, len(data) - 4):
+        if data[i] == 0xFF and data[i + 1] & 0xE0 == 0xE0:
+            mpeg1 = (data[i + 1] >> 3) & 0x3 == 0x3
+            bitrate = _mp3_bitrates[mpeg1][data[i + 2] >> 4]
+            if bitrate:
+                return (len(data) - i) * 8 / (bitrate * 1000)
+    return None
+
+
+def duration_of(path):
+    if shutil.which('ffprobe'):
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path],
+            capture_output=True, text=True)
+        if result.returncode == 0 and result.stdout.strip():
+            return float(result.stdout.strip())
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.wav':
+        return wav_duration(path)
+    if ext == '.mp3':
+        return mp3_duration(path)
+    return None
+
+
+def normalize_wav(src, dst):
+    """Scale a 16-bit PCM WAV to the target RMS loudness without exceeding the peak ceiling."""
+    with wave.open(src, 'rb') as w:
+        params = w.getparams()
+        frames = w.readframes(w.getnframes())
+    if params.sampwidth != 2:
+        shutil.copyfile(src, dst)
+        return
+    samples = np.frombuffer(frames, dtype='<i2').astype(np.float64) / 32768
+    rms = np.sqrt(np.mean(samples ** 2)) if samples.size else 0.0
+    peak = np.max(np.abs(samples)) if samples.size else 0.0
+    if rms > 0:
+        gain = min(10 ** (TARGET_RMS_DBFS / 20) / rms, 10 ** (PEAK_CEILING_DBFS / 20) / peak)
+        samples = samples * gain
+    out = np.clip(np.round(samples * 32768), -32768, 32767).astype('<i2')
+    with wave.open(dst, 'wb') as w:
+        w.setparams(params)
+        w.writeframes(out.tobytes())
+
+
+def encode(src, dst, codec_args):
+    # EBU R128 loudness normalisation, mono, then the requested codec
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', src,
+         '-af', f'loudnorm=I={TARGET_RMS_DBFS:.0f}:TP={PEAK_CEILING_DBFS:.0f}', '-ac', '1']
+        + codec_args + [dst],
+        check=True)
+
+
+def build(root=AUDIO_ROOT):
+    """Normalise and compress every clip under ``root`` and write the manifest."""
+    dist = os.path.join(root, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    has_ffmpeg = shutil.which('ffmpeg') is not None
+    if not has_ffmpeg:
+        print("ffmpeg not found: writing normalised WAV variants only", file=sys.stderr)
+
+    clips = {}
+    for filename in sorted(os.listdir(root)):
+        name, ext = os.path.splitext(filename)
+        if ext.lower() not in _mime_types:
+            continue
+        src = os.path.join(root, filename)
+        outputs = []
+        if has_ffmpeg:
+            outputs.append((f'{name}.opus.ogg', ['-c:a', 'libopus', '-b:a', '24k']))
+            outputs.append((f'{name}.mp3', ['-c:a', 'libmp3lame', '-b:a', '32k']))
+            for out_name, codec_args in outputs:
+                encode(src, os.path.join(dist, out_name), codec_args)
+        elif ext.lower() == '.wav':
+            normalize_wav(src, os.path.join(dist, filename))
+            outputs.append((filename, None))
+        else:
+            # Already compressed; copied through unchanged
+            shutil.copyfile(src, os.path.join(dist, filename))
+            outputs.append((filename, None))
+
+        variants = []
+        for out_name, _ in outputs:
+            path = os.path.join(dist, out_name)
+            variants.append({
+                'file': f'{DIST_DIR}/{out_name}',
+                'format': _mime_types[os.path.splitext(out_name)[1].lower()],
+                'bytes': os.path.getsize(path),
+                'duration': round(duration_of(path) or 0.0, 3),
+                'sha256': file_digest(path),
+            })
+        clips[name] = {
+            'source': filename,
+            'source_bytes': os.path.getsize(src),
+            'source_sha256': file_digest(src),
+            'variants': sorted(variants, key=lambda v: v['bytes']),
+        }
+        print(f"{filename:>22}: {os.path.getsize(src):>7} B -> "
+              + ", ".join(f"{v['file']} {v['bytes']} B" for v in variants))
+
+    manifest = {'version': 1, 'clips': clips}
+    with open(os.path.join(root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    _manifests[os.path.abspath(root)] = manifest
+    return manifest
+
+
+def _scan_sources(root):
+    # Stand-in manifest used when the build step has not been run
+    clips = {}
+    for filename in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        name, ext = os.path.splitext(filename)
+        if ext.lower() in _mime_types:
+            path = os.path.join(root, filename)
+            clips[name] = {'source': filename,
+                           'variants': [{'file': filename, 'format': _mime_types[ext.lower()],
+                                         'bytes': os.path.getsize(path), 'sha256': file_digest(path)}]}
+    return {'version': 1, 'clips': clips}
+
+
+def hashed_name(variant):
+    """Content-addressed file name of a variant, e.g. ``Bat_Pat.3f9c01d2a4b6.mp3``."""
+    stem, ext = os.path.splitext(os.path.basename(variant['file']))
+    return f"{stem}.{variant['sha256'][:HASH_LENGTH]}{ext}"
+
+
+_manifests = {}  # absolute root -> manifest
+
+
+def manifest(root=AUDIO_ROOT):
+    """The clip manifest of ``root``, loaded once per process."""
+    key = os.path.abspath(root)
+    if key not in _manifests:
+        path = os.path.join(root, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                _manifests[key] = json.load(f)
+        else:
+            _manifests[key] = _scan_sources(root)
+    return _manifests[key]
+
+
+def _preferred(name, root):
+    clip = manifest(root)['clips'].get(name)
+    if clip is None:
+        return None
+    rank = {fmt: i for i, fmt in enumerate(FORMAT_PREFERENCE)}
+    return min(clip['variants'], key=lambda v: (rank.get(v['format'], len(rank)), v.get('bytes', 0)))
+
+
+def resolve(name, root=AUDIO_ROOT):
+    """(path, mime type) of the preferred variant of clip ``name``, or None if unknown."""
+    best = _preferred(name, root)
+    if best is None:
+        return None
+    return os.path.join(root, best['file']), best['format']
+
+
+def url_for(name, root=AUDIO_ROOT, base_url=MEDIA_URL):
+    """(content-hashed URL, mime type) of clip ``name`` under ``base_url``, or None.
+
+    None when no media server is configured or the clip is unknown.
+    """
+    best = _preferred(name, root) if base_url else None
+    if best is None:
+        return None
+    return f"{base_url.rstrip('/')}/{hashed_name(best)}", best['format']
+
+
+def static_assets(root=AUDIO_ROOT):
+    """Every variant by content-hashed name: {name: (path, mime type, sha256)}."""
+    return {hashed_name(v): (os.path.join(root, v['file']), v['format'], v['sha256'])
+            for clip in manifest(root)['clips'].values() for v in clip['variants']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build compressed audio variants and the clip manifest.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help="Normalise, compress and index the clips")
+    build_parser.add_argument('--root', default=AUDIO_ROOT)
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        build(args.root)
+
+
+if __name__ == '__main__':
+    main()
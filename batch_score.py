@@ -0,0 +1,138 @@
+"""Score applicant CSV files in bulk.
+
+Reads CSVs laid out like ``labelled_dysx.csv`` (the six feature columns used
+by the app, any extra columns are passed through), streams them in fixed-size
+chunks and scores the chunks on a pool of worker processes.  Each output row
+gets the predicted label, the risk level and one probability column per class.
+Rows with a missing or non-numeric score are left unscored and flagged in
+``Score_error``.
+
+Usage:
+    python batch_score.py applicants.csv scored.csv --chunk-size 200000 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from artifacts import MODEL_PATH, SCALER_PATH
+
+# The exact feature names used during training
+columns = ['Language_vocab', 'Memory', 'Speed', 'Visual_discrimination', 'Audio_Discrimination', 'Survey_Score']
+
+# Model labels as interpreted by predict_dyslexia in app.py
+risk_levels = {0: 'high', 1: 'moderate', 2: 'low'}
+
+# Per-process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(model_path, scaler_path):
+    from artifacts import ArtifactCache
+    from forest_engine import raw_forest
+    # A compiled .forest model is memory-mapped, so all workers share one copy
+    bundle = ArtifactCache(model_path, scaler_path).current()
+    _worker['engine'] = raw_forest(bundle)
+
+
+def score_features(X):
+    """Return (proba, labels) for a float array of raw scores, shape (n_rows, 6)."""
+    engine = _worker['engine']
+    proba = engine.predict_proba(X)
+    labels = engine.classes.take(np.argmax(proba, axis=1))
+    return proba, labels
+
+
+def _score_chunk(chunk, batch_size, header):
+    """Score one chunk and return it already formatted as CSV text.
+
+    Rows with a missing, non-numeric or non-finite feature are not scored:
+    their label, risk level and probabilities are left empty and
+    ``Score_error`` names the offending columns.
+    """
+    features = chunk[columns].apply(pd.to_numeric, errors='coerce')
+    invalid = ~np.isfinite(features.to_numpy(dtype=np.float64))
+    valid = ~invalid.any(axis=1)
+    X = features.to_numpy(dtype=np.float64)[valid]
+    classes = _worker['engine'].classes
+    # Score in smaller slices so the (rows x trees) traversal stays cache-sized
+    proba = np.full((len(chunk), len(classes)), np.nan)
+    labels = pd.array([pd.NA] * len(chunk), dtype='Int64')
+    rows = np.flatnonzero(valid)
+    for start in range(0, len(X), batch_size):
+        batch_proba, batch_labels = score_features(X[start:start + batch_size])
+        proba[rows[start:start + batch_size]] = batch_proba
+        labels[rows[start:start + batch_size]] = batch_labels.astype(np.int64)
+
+    out = chunk.copy()
+    out['Predicted_label'] = labels
+    out['Risk_level'] = pd.Series(labels, index=out.index).map(risk_levels)
+    for i, cls in enumerate(classes):
+        out[f'Proba_{cls}'] = proba[:, i]
+    out['Score_error'] = ['' if ok else 'invalid ' + ', '.join(np.asarray(columns)[bad])
+                          for ok, bad in zip(valid, invalid)]
+    return out.to_csv(header=header, index=False)
+
+
+def score_csv(input_path, output_path, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+              chunk_size=100_000, batch_size=4096, workers=None, max_pending=None):
+    """Stream ``input_path`` through the model and write ``output_path``.
+
+    At most ``max_pending`` chunks (default: two per worker) are in flight, so
+    memory use is bounded by the chunk size rather than the file size.
+    Workers return formatted CSV text, so the parent only parses and writes.
+    Returns the number of rows written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    reader = pd.read_csv(input_path, chunksize=chunk_size, encoding='utf-8-sig')
+
+    rows = 0
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, scaler_path)) as pool, \
+            open(output_path, 'w', newline='') as out_file:
+
+        def drain_one():
+            nonlocal rows
+            n, future = pending.popleft()
+            out_file.write(future.result())
+            rows += n
+
+        for i, chunk in enumerate(reader):
+            missing = [c for c in columns if c not in chunk.columns]
+            if missing:
+                raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+            pending.append((len(chunk), pool.submit(_score_chunk, chunk, batch_size, i == 0)))
+            if len(pending) >= max_pending:
+                drain_one()
+        while pending:
+            drain_one()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score applicant CSVs with the dyslexia model.")
+    parser.add_argument('input', help="CSV with the six feature columns")
+    parser.add_argument('output', help="Where to write the scored CSV")
+    parser.add_argument('--model', default=MODEL_PATH, help="model.pkl or a compiled .forest file")
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="Rows read per chunk")
+    parser.add_argument('--batch-size', type=int, default=4096, help="Rows scored per vectorized call")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = score_csv(args.input, args.output, args.model, args.scaler,
+                     chunk_size=args.chunk_size, batch_size=args.batch_size, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
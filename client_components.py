@@ -0,0 +1,53 @@
+"""Browser-side widgets that keep timed work off the Streamlit script thread.
+
+Each component is a static HTML page under ``components/`` that talks to
+Streamlit through the custom-component message protocol, so no frontend
+build step is needed.
+"""
+import os
+import time
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_components_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'components')
+
+_sequence_reveal = components.declare_component(
+    'sequence_reveal', path=os.path.join(_components_dir, 'sequence_reveal'))
+
+
+def sequence_reveal(sequence, key, seconds=5, label="Display Sequence"):
+    """Button that shows ``sequence`` in the browser for ``seconds``, then hides it.
+
+    The sequence is not part of the page until the button is clicked: the
+    click sends ``{'requested': True}``, and only the rerun it triggers
+    passes the sequence to the browser, which then runs the reveal and
+    countdown itself.  ``key`` is required, as the click is read back from
+    the session state.  Returns None until the sequence has been hidden
+    again, then a dict with ``shown_at`` and ``hidden_at`` (browser clock,
+    milliseconds since the epoch).
+    """
+    state = st.session_state.get(key) or {}
+    value = _sequence_reveal(sequence=sequence if state.get('requested') else None, seconds=seconds,
+                             label=label, key=key, default=None)
+    if value and 'hidden_at' in value:
+        return {'shown_at': value['shown_at'], 'hidden_at': value['hidden_at']}
+    return None
+
+_countdown_timer = components.declare_component(
+    'countdown_timer', path=os.path.join(_components_dir, 'countdown_timer'))
+
+
+def countdown_timer(start_time, duration, time_up=False, key=None):
+    """Countdown to ``start_time + duration`` (seconds since the epoch, server clock), run by the browser.
+
+    Each render also carries the server's current time, from which the
+    browser keeps the offset between its clock and the server's, so a
+    skewed client clock neither ends the countdown early nor late.  With a
+    ``key`` the component is not remounted by reruns, so the running timer
+    carries on.  When the browser's countdown reaches zero it sends a value
+    (``expired_at``, ms since the epoch) that triggers a rerun, and repeats
+    every few seconds until the server passes ``time_up=True``.
+    """
+    return _countdown_timer(start_time=start_time, duration=duration, time_up=time_up,
+                            server_now=time.time(), key=key, default=None)
@@ -0,0 +1,413 @@
+"""Live cohort distributions of test scores and predicted risk, by site and day.
+
+Every completed prediction adds its six feature values and predicted label
+to a ``Cell`` for its ``(site, day)`` and to the all-sites cell for that day
+(site ``'*'``).  A cell holds, per feature, a ``QuantileSketch`` (counts
+over ``RESOLUTION`` equal-width bins of the feature's [0, 1] range, plus
+exact count, sum, min and max), and a count per label.  A quantile read from
+a sketch is within half a bin (0.0005) of the exact one.
+
+Cells are mergeable by adding their arrays, so a query over a window of days
+merges at most one cell per day, and cells from several app processes
+combine into the same totals.  Query cost depends on the window length, not
+on how many test-takers it covers.
+
+Each app process keeps its cells in memory and writes them to
+``DYSLEXIA_COHORT_DIR`` (default ``cohort_stats/``) as
+``<host>-<pid>.json`` every ``SAVE_INTERVAL`` seconds and once more at exit;
+``load_dir`` merges every process's file.  Days older than
+``DYSLEXIA_COHORT_RETENTION_DAYS`` (default 90) are dropped, and ``compact``
+(run by the app processes as they save) folds the files of processes that
+have stopped saving, and of ``ingest`` runs, into ``compacted.json``, so a
+query reads one file per running process plus one.
+
+The site comes from ``?site=`` in the app URL when it is listed in
+``DYSLEXIA_SITES`` (comma-separated), else ``DYSLEXIA_SITE``.
+
+Usage:
+    python cohort_stats.py query --site clinic-a --days 7
+    python cohort_stats.py ingest scored.csv --site archive --day-column date
+    python cohort_stats.py compact
+"""
+import argparse
+import atexit
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+import scoring
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+COHORT_DIR = os.environ.get('DYSLEXIA_COHORT_DIR', 'cohort_stats')
+DEFAULT_SITE = os.environ.get('DYSLEXIA_SITE', 'default')
+# Sites the app accepts from ?site=; anything else is recorded under DEFAULT_SITE
+SITES = {DEFAULT_SITE} | {site.strip() for site in os.environ.get('DYSLEXIA_SITES', '').split(',') if site.strip()}
+ALL_SITES = '*'
+RESOLUTION = 1000
+SAVE_INTERVAL = 30.0
+RETENTION_DAYS = int(os.environ.get('DYSLEXIA_COHORT_RETENTION_DAYS', 90))
+# A process file not rewritten for this long belongs to a process that has stopped
+STALE_SECONDS = 10 * SAVE_INTERVAL
+COMPACTED = 'compacted.json'
+
+features = scoring.columns
+# Model labels as interpreted by predict_dyslexia in app.py
+risk_levels = {0: 'high', 1: 'moderate', 2: 'low'}
+
+
+def today():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+def site_for(requested):
+    """The site to record a prediction under: ``requested`` if it is a configured site, else DEFAULT_SITE."""
+    return requested if requested in SITES else DEFAULT_SITE
+
+
+class QuantileSketch:
+    """Fixed-grid quantile sketch over [0, 1]: O(1) updates, exact merges, bounded error."""
+
+    def __init__(self, resolution=RESOLUTION):
+        self.counts = np.zeros(resolution, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def _bins(self, values):
+        return np.clip((np.asarray(values, dtype=np.float64) * len(self.counts)).astype(np.int64),
+                       0, len(self.counts) - 1)
+
+    def add(self, value):
+        value = float(value)
+        self.counts[min(max(int(value * len(self.counts)), 0), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.counts += np.bincount(self._bins(values), minlength=len(self.counts))
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantiles(self, qs):
+        """Values at the quantiles ``qs`` (bin midpoints, clamped to the exact min and max)."""
+        if self.count == 0:
+            return [None] * len(qs)
+        cumulative = np.cumsum(self.counts)
+        ranks = np.ceil(np.asarray(qs, dtype=np.float64) * self.count).clip(1, self.count)
+        bins = np.searchsorted(cumulative, ranks)
+        values = (bins + 0.5) / len(self.counts)
+        return [float(v) for v in np.clip(values, self.min, self.max)]
+
+    def histogram(self, bins=10):
+        """Counts over ``bins`` equal-width bins of [0, 1] (``bins`` must divide the resolution)."""
+        return self.counts.reshape(bins, -1).sum(axis=1).tolist()
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.counts)
+        return {'bins': nonzero.tolist(), 'counts': self.counts[nonzero].tolist(), 'count': self.count,
+                'total': self.total, 'min': self.min if self.count else None,
+                'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data, resolution=RESOLUTION):
+        sketch = cls(resolution)
+        sketch.counts[data['bins']] = data['counts']
+        sketch.count = data['count']
+        sketch.total = data['total']
+        if data['count']:
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
+
+
+class Cell:
+    """Sketches of every feature and the label counts for one (site, day)."""
+
+    def __init__(self, resolution=RESOLUTION):
+        self.sketches = {name: QuantileSketch(resolution) for name in features}
+        self.labels = np.zeros(len(risk_levels), dtype=np.int64)
+
+    def add(self, row, label):
+        for name, value in zip(features, row):
+            self.sketches[name].add(value)
+        self.labels[int(label)] += 1
+
+    def add_many(self, X, labels):
+        X = np.asarray(X, dtype=np.float64)
+        for i, name in enumerate(features):
+            self.sketches[name].add_many(X[:, i])
+        self.labels += np.bincount(np.asarray(labels, dtype=np.int64), minlength=len(self.labels))
+
+    def merge(self, other):
+        for name in features:
+            self.sketches[name].merge(other.sketches[name])
+        self.labels += other.labels
+        return self
+
+    def to_dict(self):
+        return {'sketches': {name: s.to_dict() for name, s in self.sketches.items()},
+                'labels': self.labels.tolist()}
+
+    @classmethod
+    def from_dict(cls, data, resolution=RESOLUTION):
+        cell = cls(resolution)
+        cell.sketches = {name: QuantileSketch.from_dict(data['sketches'][name], resolution) for name in features}
+        cell.labels = np.asarray(data['labels'], dtype=np.int64)
+        return cell
+
+
+class CohortStats:
+    """Cells keyed by (site, day), with each day's all-sites cell kept up to date alongside."""
+
+    def __init__(self, resolution=RESOLUTION):
+        self.resolution = resolution
+        self.cells = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, site, day):
+        cell = self.cells.get((site, day))
+        if cell is None:
+            cell = self.cells[(site, day)] = Cell(self.resolution)
+        return cell
+
+    def record(self, row, label, site=DEFAULT_SITE, day=None):
+        """Add one prediction: the six feature values in training-column order and its label."""
+        day = day or today()
+        with self._lock:
+            self._cell(site, day).add(row, label)
+            self._cell(ALL_SITES, day).add(row, label)
+
+    def record_many(self, X, labels, site=DEFAULT_SITE, day=None):
+        day = day or today()
+        with self._lock:
+            self._cell(site, day).add_many(X, labels)
+            self._cell(ALL_SITES, day).add_many(X, labels)
+
+    def merge(self, other):
+        with self._lock:
+            for key, cell in other.cells.items():
+                self._cell(*key).merge(cell)
+        return self
+
+    def window(self, site=ALL_SITES, days=1, end=None):
+        """The merged cell for ``site`` over the ``days`` days ending on ``end`` (default today)."""
+        end = datetime.date.fromisoformat(end or today())
+        merged = Cell(self.resolution)
+        with self._lock:
+            for offset in range(days):
+                cell = self.cells.get((site, (end - datetime.timedelta(days=offset)).isoformat()))
+                if cell is not None:
+                    merged.merge(cell)
+        return merged
+
+    def summary(self, site=ALL_SITES, days=1, end=None, qs=(0.1, 0.25, 0.5, 0.75, 0.9), bins=10):
+        """Dashboard view of a window: per-feature count, mean, quantiles and histogram, and label shares."""
+        cell = self.window(site, days, end)
+        result = {'site': site, 'days': days, 'end': end or today(), 'features': {}}
+        for name, sketch in cell.sketches.items():
+            result['features'][name] = {
+                'count': sketch.count,
+                'mean': sketch.total / sketch.count if sketch.count else None,
+                'min': sketch.min if sketch.count else None,
+                'max': sketch.max if sketch.count else None,
+                'quantiles': dict(zip((str(q) for q in qs), sketch.quantiles(qs))),
+                'histogram': sketch.histogram(bins),
+            }
+        total = int(cell.labels.sum())
+        result['labels'] = {risk_levels[i]: {'count': int(n), 'share': int(n) / total if total else None}
+                            for i, n in enumerate(cell.labels)}
+        return result
+
+    def prune(self, days=RETENTION_DAYS, end=None):
+        """Drop the cells of days before the ``days`` days ending on ``end`` (default today)."""
+        first = (datetime.date.fromisoformat(end or today()) - datetime.timedelta(days=days - 1)).isoformat()
+        with self._lock:
+            self.cells = {key: cell for key, cell in self.cells.items() if key[1] >= first}
+        return self
+
+    def sites(self):
+        with self._lock:
+            return sorted({site for site, _ in self.cells if site != ALL_SITES})
+
+    def save(self, path):
+        with self._lock:
+            data = {'resolution': self.resolution,
+                    'cells': [{'site': site, 'day': day, **cell.to_dict()}
+                              for (site, day), cell in self.cells.items()]}
+        # Per process and thread, so concurrent saves of one path never write the same temporary file
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        stats = cls(data['resolution'])
+        for entry in data['cells']:
+            stats.cells[(entry['site'], entry['day'])] = Cell.from_dict(entry, data['resolution'])
+        return stats
+
+
+def load_dir(directory=COHORT_DIR):
+    """Every process's saved cells, merged."""
+    merged = CohortStats()
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json'):
+                merged.merge(CohortStats.load(os.path.join(directory, name)))
+    return merged
+
+
+def compact(directory=COHORT_DIR, days=RETENTION_DAYS, stale_seconds=STALE_SECONDS):
+    """Fold finished processes' files into ``compacted.json`` and drop expired days; returns the files folded.
+
+    A file counts as finished when it has not been rewritten for
+    ``stale_seconds``.  Nothing is done while another process is compacting.
+    """
+    lock = open(os.path.join(directory, 'compact.lock'), 'a')
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return []
+        compacted_path = os.path.join(directory, COMPACTED)
+        now = time.time()
+        finished = [name for name in sorted(os.listdir(directory))
+                    if name.endswith('.json') and name != COMPACTED
+                    and now - os.path.getmtime(os.path.join(directory, name)) > stale_seconds]
+        compacted_day = (datetime.datetime.fromtimestamp(os.path.getmtime(compacted_path), datetime.timezone.utc)
+                         .strftime('%Y-%m-%d') if os.path.exists(compacted_path) else None)
+        # Expired days only need dropping once a day
+        if not finished and compacted_day in (None, today()):
+            return []
+        stats = CohortStats.load(compacted_path) if compacted_day else CohortStats()
+        for name in finished:
+            stats.merge(CohortStats.load(os.path.join(directory, name)))
+        stats.prune(days).save(compacted_path)
+        for name in finished:
+            os.remove(os.path.join(directory, name))
+        return finished
+    finally:
+        lock.close()
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats(directory=COHORT_DIR, interval=SAVE_INTERVAL):
+    """This process's cohort stats, saved to ``directory`` every ``interval`` seconds by a background thread.
+
+    Expired days are dropped before each save, and the stats are saved once
+    more when the process exits.
+    """
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f'{socket.gethostname()}-{os.getpid()}.json')
+                # A stopped server's file may have our pid: fold it away first, so it is not overwritten
+                compact(directory)
+                # A restart quick enough to leave it fresh carries on from it instead
+                stats = CohortStats.load(path) if os.path.exists(path) else CohortStats()
+                save_lock = threading.Lock()
+
+                def save():
+                    with save_lock:
+                        stats.prune().save(path)
+
+                def save_loop():
+                    while True:
+                        time.sleep(interval)
+                        try:
+                            save()
+                            compact(directory)
+                        except OSError:
+                            pass
+                threading.Thread(target=save_loop, name='cohort-stats-writer', daemon=True).start()
+                atexit.register(save)
+                _stats = stats
+    return _stats
+
+
+def ingest_csv(path, stats, site=DEFAULT_SITE, day_column=None, label_column='Label', chunk_size=100_000):
+    """Add the rows of a scored CSV (six feature columns and a label column) to ``stats``."""
+    import pandas as pd
+
+    rows = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size, encoding='utf-8-sig'):
+        if day_column is None:
+            stats.record_many(chunk[features].to_numpy(dtype=np.float64), chunk[label_column], site)
+        else:
+            days = pd.to_datetime(chunk[day_column]).dt.strftime('%Y-%m-%d')
+            for day, group in chunk.groupby(days):
+                stats.record_many(group[features].to_numpy(dtype=np.float64), group[label_column], site, day)
+        rows += len(chunk)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or fill the cohort score distributions.")
+    parser.add_argument('--dir', default=COHORT_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    query_parser = sub.add_parser('query', help="Print the summary of a site and window")
+    query_parser.add_argument('--site', default=ALL_SITES)
+    query_parser.add_argument('--days', type=int, default=1)
+    query_parser.add_argument('--end', help="Last day of the window (YYYY-MM-DD, default today)")
+    ingest_parser = sub.add_parser('ingest', help="Add the rows of a scored CSV (e.g. from batch_score.py)")
+    ingest_parser.add_argument('csv')
+    ingest_parser.add_argument('--site', default=DEFAULT_SITE)
+    ingest_parser.add_argument('--day-column', help="Column holding each row's date (default: all rows today)")
+    ingest_parser.add_argument('--label-column', default='Label')
+    sub.add_parser('compact', help="Fold finished processes' files into compacted.json and drop expired days")
+    args = parser.parse_args(argv)
+
+    if args.command == 'query':
+        print(json.dumps(load_dir(args.dir).summary(args.site, args.days, args.end), indent=2))
+    elif args.command == 'compact':
+        os.makedirs(args.dir, exist_ok=True)
+        folded = compact(args.dir)
+        print(f"Folded {len(folded)} files into {os.path.join(args.dir, COMPACTED)}")
+    else:
+        os.makedirs(args.dir, exist_ok=True)
+        stats = CohortStats()
+        rows = ingest_csv(args.csv, stats, args.site, args.day_column, args.label_column)
+        path = os.path.join(args.dir, f'ingest-{int(time.time())}.json')
+        stats.save(path)
+        print(f"Added {rows} rows to {path}")
+
+
+if __name__ == '__main__':
+    main()
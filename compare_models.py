@@ -0,0 +1,210 @@
+"""Compare candidate models over k-fold cross-validation, with cached folds.
+
+The candidates are the ones ``Details_dyslexia.ipynb`` compares on a single
+80/20 split: a decision tree, a random forest, a linear SVM, and the random
+forest and SVM grid searches (tuned with ``GridSearchCV`` inside each fold,
+so the reported scores are never measured on rows the tuning saw).  Each
+candidate is a ``StandardScaler`` + model pipeline, so the scaler is also
+fitted on the training part of each fold only.
+
+Every (candidate, fold) pair is an independent task, and the tasks run in
+parallel, one per worker process.  A finished fold is pickled to
+``--cache-dir`` (default ``model_cache/``) under a key hashed from the data
+file, the fold's training rows, the candidate's parameters and grid, and the
+scikit-learn version, so a re-run only fits the folds whose inputs changed
+(e.g. a new candidate, a changed grid, or new data).  The cached entry holds
+the fitted pipeline, its fold predictions, the fit time and the per-row
+latency.
+
+The table reports, per candidate, the mean (and std over folds) of
+accuracy, macro-F1 and mean absolute error, the fit time per fold, and the
+median latency of predicting one row at a time, as the app does.  Fit times
+of folds fitted side by side include some contention between workers.
+
+Usage:
+    python compare_models.py --data labelled_dysx.csv --folds 5 --workers 4
+    python compare_models.py --only "SVM (GridSearch)" --output comparison.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from artifacts import file_digest
+from train_model import load_data
+
+CACHE_DIR = os.environ.get('DYSLEXIA_MODEL_CACHE', 'model_cache')
+LATENCY_ROWS = 50
+
+# name -> (estimator, parameter grid or None), as in Details_dyslexia.ipynb
+CANDIDATES = {
+    'DecisionTree': (DecisionTreeClassifier(random_state=1), None),
+    'RandomForest': (RandomForestClassifier(random_state=0), None),
+    'SVM': (SVC(kernel='linear'), None),
+    'RandomForest (GridSearch)': (RandomForestClassifier(random_state=0),
+                                  {'n_estimators': [10, 100, 500, 1000]}),
+    'SVM (GridSearch)': (SVC(), [{'kernel': ['rbf'], 'gamma': [1e-3, 1e-4], 'C': [1, 10, 100, 1000]},
+                                 {'kernel': ['linear'], 'C': [1, 10, 100, 1000]}]),
+}
+
+
+def build(estimator, grid, scoring='f1_macro'):
+    """A fresh, unfitted pipeline for a candidate."""
+    model = sklearn.clone(estimator)
+    if grid is not None:
+        model = GridSearchCV(model, grid, scoring=scoring)
+    return make_pipeline(StandardScaler(), model)
+
+
+def fold_key(data_sha256, train_index, estimator, grid, scoring):
+    """Cache key of one fitted fold: everything that changes what the fit produces."""
+    digest = hashlib.sha256()
+    for part in (data_sha256, type(estimator).__name__, repr(sorted(estimator.get_params().items())),
+                 json.dumps(grid, sort_keys=True), scoring, sklearn.__version__):
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    digest.update(np.asarray(train_index, dtype='<i8').tobytes())
+    return digest.hexdigest()[:24]
+
+
+def row_latency(model, X, rows=LATENCY_ROWS):
+    """Median seconds to predict a single row, over up to ``rows`` rows of ``X``."""
+    times = []
+    for row in X[:rows]:
+        row = row.reshape(1, -1)
+        start = time.perf_counter()
+        model.predict(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def fit_fold(X, y, train_index, valid_index, estimator, grid, scoring):
+    """Fit one candidate on one fold; returns the entry stored in the cache."""
+    model = build(estimator, grid, scoring)
+    start = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - start
+    entry = {'model': model, 'predicted': model.predict(X[valid_index]), 'fit_seconds': fit_seconds,
+             'latency_seconds': row_latency(model, X[valid_index])}
+    if grid is not None:
+        entry['best_params'] = model[-1].best_params_
+    return entry
+
+
+def _fold_task(args):
+    X, y, train_index, valid_index, estimator, grid, scoring, path = args
+    entry = fit_fold(X, y, train_index, valid_index, estimator, grid, scoring)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(entry, f)
+    os.replace(tmp, path)
+    return entry
+
+
+def _load_entry(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def compare(data_path, candidates=CANDIDATES, folds=5, workers=1, scoring='f1_macro', seed=10,
+            cache_dir=CACHE_DIR):
+    """Cross-validate every candidate, fitting only uncached folds; returns {name: summary}."""
+    X, y = load_data(data_path)
+    X, y = X.to_numpy(dtype=np.float64), y.to_numpy()
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+    data_sha256 = file_digest(data_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    entries, tasks = {}, []
+    for name, (estimator, grid) in candidates.items():
+        for i, (train_index, valid_index) in enumerate(splits):
+            path = os.path.join(cache_dir, fold_key(data_sha256, train_index, estimator, grid, scoring) + '.pkl')
+            entry = _load_entry(path)
+            if entry is None:
+                tasks.append(((name, i), (X, y, train_index, valid_index, estimator, grid, scoring, path)))
+            else:
+                entries[(name, i)] = dict(entry, cached=True)
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = pool.map(_fold_task, [task for _, task in tasks])
+            for (key, _), entry in zip(tasks, results):
+                entries[key] = dict(entry, cached=False)
+    else:
+        for key, task in tasks:
+            entries[key] = dict(_fold_task(task), cached=False)
+
+    summary = {}
+    for name in candidates:
+        fold_entries = [entries[(name, i)] for i in range(len(splits))]
+        scores = {'accuracy': [], 'f1_macro': [], 'mean_absolute_error': []}
+        for entry, (_, valid_index) in zip(fold_entries, splits):
+            expected, predicted = y[valid_index], entry['predicted']
+            scores['accuracy'].append(accuracy_score(expected, predicted))
+            scores['f1_macro'].append(f1_score(expected, predicted, average='macro'))
+            scores['mean_absolute_error'].append(mean_absolute_error(expected, predicted))
+        summary[name] = {
+            **{metric: {'mean': float(np.mean(values)), 'std': float(np.std(values))}
+               for metric, values in scores.items()},
+            'fit_seconds': float(np.mean([e['fit_seconds'] for e in fold_entries])),
+            'latency_seconds': float(np.median([e['latency_seconds'] for e in fold_entries])),
+            'cached_folds': sum(e['cached'] for e in fold_entries),
+            'best_params': [e['best_params'] for e in fold_entries if 'best_params' in e],
+        }
+    return summary
+
+
+def format_table(summary):
+    lines = [f"{'Model':<26}{'Accuracy':>16}{'Macro-F1':>16}{'MAE':>16}{'Fit s/fold':>12}"
+             f"{'us/row':>9}{'Cached':>8}"]
+    for name, result in summary.items():
+        cells = [f"{result[m]['mean']:.3f} +/- {result[m]['std']:.3f}"
+                 for m in ('accuracy', 'f1_macro', 'mean_absolute_error')]
+        lines.append(f"{name:<26}{cells[0]:>16}{cells[1]:>16}{cells[2]:>16}{result['fit_seconds']:>12.3f}"
+                     f"{result['latency_seconds'] * 1e6:>9.0f}{result['cached_folds']:>8}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validate the candidate models and compare them.")
+    parser.add_argument('--data', default='labelled_dysx.csv')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--scoring', default='f1_macro', help="Score the grid searches tune for")
+    parser.add_argument('--seed', type=int, default=10, help="Seed of the fold shuffle")
+    parser.add_argument('--only', nargs='+', choices=list(CANDIDATES), help="Candidates to run (default: all)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--output', help="Also write the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    candidates = {name: CANDIDATES[name] for name in (args.only or CANDIDATES)}
+    start = time.perf_counter()
+    summary = compare(args.data, candidates, args.folds, args.workers, args.scoring, args.seed, args.cache_dir)
+    print(format_table(summary))
+    for name, result in summary.items():
+        if result['best_params']:
+            print(f"{name} best parameters per fold: {result['best_params']}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'data': args.data, 'folds': args.folds, 'results': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
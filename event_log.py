@@ -0,0 +1,541 @@
+"""Append-only log of test-taker events, for restoring sessions after a restart.
+
+Every answer, submit, audio play and timer change is appended to a log
+segment in ``DYSLEXIA_EVENT_LOG_DIR`` (default ``session_log/``) as one JSON
+line:
+
+    {"seq": 812, "t": 1718000000.1, "session": "3f2a...", "kind": "answer",
+     "state": {"vocab_user_answers": [...]}, "data": {}}
+
+``state`` holds the session-state values that changed, so replaying a
+session's events in order rebuilds its state.  Writes go through a single
+background thread that commits whatever has queued up since its last write
+with one ``fsync`` (group commit), so a burst of answers costs one disk flush
+rather than one each.
+
+The latest state of every live session is also kept in memory, and every
+``snapshot_every`` events it is written out as a compact snapshot, after
+which the older segments are deleted.  On start-up the log is recovered by
+loading the newest snapshot and replaying the segments written after it; a
+torn last line from a crash is ignored.  ``restore(session)`` is then a
+dictionary lookup, so a reconnecting session gets its answers back without
+the server having had to drain sessions before a deploy.
+
+Several processes can share a log directory: replicas on one host, the old
+and new server during a rolling deploy, and the ``show``/``compact``
+commands.  Each writer appends to its own segments,
+``events-<writer>-<first seq>.log``, and holds ``writer-<writer>.lock`` while
+it runs.  ``restore`` first reads what other writers have appended since
+its last look, so a session that moves to another process gets its latest
+state; values carry their event time, so a late-read older value never
+replaces a newer one.  The process holding ``LOCK`` (taken without waiting,
+and retried at every snapshot) writes the snapshots and deletes the
+segments they cover, including those of writers that have exited; every
+other writer starts a new segment at the same interval and deletes its own
+segments once a snapshot covers them.  A failed write (e.g. a full disk) is rolled back and raised in the callers
+waiting on it.
+
+Usage:
+    python event_log.py show SESSION_ID
+    python event_log.py compact
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOG_DIR = os.environ.get('DYSLEXIA_EVENT_LOG_DIR', 'session_log')
+
+# Event kinds
+START = 'start'
+ANSWER = 'answer'
+SUBMIT = 'submit'
+REVEAL = 'reveal'
+AUDIO_PLAY = 'audio_play'
+TIMER = 'timer'
+
+
+def _segment_name(writer, first_seq):
+    return f'events-{writer}-{first_seq:012d}.log'
+
+
+def _segment_writer(name):
+    # Segments from before per-writer files are named events-<first seq>.log; their writer is ''
+    writer, _, _ = name[len('events-'):-len('.log')].rpartition('-')
+    return writer
+
+
+def _snapshot_name(created):
+    return f'snapshot-{int(created * 1000):015d}.json'
+
+
+def _writer_lock_name(writer):
+    return f'writer-{writer}.lock'
+
+
+def _fsync_dir(directory):
+    if os.name == 'posix':
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _try_lock(path):
+    """An open file holding an exclusive lock on ``path``, or None if another process holds it."""
+    f = open(path, 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class _Commit:
+    """Completion of queued lines, waited on by durable appends and ``flush``."""
+
+    __slots__ = ('event', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise OSError(self.error.errno, f"Event log commit failed: {self.error}")
+
+
+class EventLog:
+    """Durable per-session state, recovered from snapshot + logs on open.
+
+    With ``readonly=True`` the log is only recovered and read: nothing is
+    written and no writer thread runs.
+    """
+
+    def __init__(self, directory=LOG_DIR, snapshot_every=20_000, max_batch=512, max_age=6 * 3600,
+                 readonly=False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.max_batch = max_batch
+        self.max_age = max_age  # Sessions idle for longer are dropped at the next snapshot
+        self.readonly = readonly
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        # session -> {'state': {key: JSON text}, 'times': {key: event time}, 'updated': time}
+        self._sessions = {}
+        self._seq = 0
+        self._since_snapshot = 0
+        self._applied = {}   # writer -> highest seq applied
+        self._offsets = {}   # segment name -> bytes read
+        self._snapshot = None
+        self.commits = 0
+        self.committed_events = 0
+        self.writer = None if readonly else f'{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex[:8]}'
+        self.recovery = self._recover()
+        if readonly:
+            return
+
+        self._writer_lock = _try_lock(os.path.join(directory, _writer_lock_name(self.writer)))
+        self._compactor_lock = _try_lock(os.path.join(directory, 'LOCK'))
+        self._queue = queue.SimpleQueue()
+        self._segment_path = os.path.join(directory, _segment_name(self.writer, 1))
+        self._segment = open(self._segment_path, 'ab')
+        self._segment_size = 0
+        self._writer_thread = threading.Thread(target=self._write_loop, name='event-log-writer', daemon=True)
+        self._writer_thread.start()
+
+    # Reading the directory ----------------------------------------------------
+
+    def _recover(self):
+        start = time.perf_counter()
+        # A compaction in another process can delete files under us; start over if it does
+        for _ in range(10):
+            self._sessions, self._applied, self._offsets, self._snapshot = {}, {}, {}, None
+            try:
+                snapshot_loaded = self._load_snapshot()
+                replayed, torn = self._read_segments(initial=True)
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            raise RuntimeError(f"Could not recover {self.directory}: files kept disappearing")
+        self._since_snapshot = replayed
+        return {'snapshot': snapshot_loaded, 'replayed': replayed, 'torn': torn,
+                'sessions': len(self._sessions), 'seconds': time.perf_counter() - start}
+
+    def _load_snapshot(self):
+        """Merge the newest snapshot if it is newer than the last one merged; returns its name."""
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith('snapshot-') and n.endswith('.json'))
+        if not names or names[-1] == self._snapshot:
+            return None
+        with open(os.path.join(self.directory, names[-1]), encoding='utf-8') as f:
+            snapshot = json.load(f)
+        # Snapshots from before per-writer files cover a single sequence
+        writer_seqs = snapshot['writer_seqs'] if 'writer_seqs' in snapshot else {'': snapshot['seq']}
+        with self._lock:
+            for session, entry in snapshot['sessions'].items():
+                times = entry.get('times', {})
+                for key, value in entry['state'].items():
+                    self._apply(session, {key: value}, times.get(key, entry['updated']))
+            for writer, seq in writer_seqs.items():
+                self._applied[writer] = max(self._applied.get(writer, 0), seq)
+        self._snapshot = names[-1]
+        return names[-1]
+
+    def _read_segments(self, initial=False):
+        """Apply the complete lines other writers have added since the last read; returns (applied, torn)."""
+        applied = torn = 0
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith('events-') and n.endswith('.log'))
+        self._offsets = {name: offset for name, offset in self._offsets.items() if name in names}
+        for name in names:
+            writer = _segment_writer(name)
+            if writer == self.writer:
+                continue
+            offset = self._offsets.get(name, 0)
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                if initial:
+                    raise
+                # Compacted away; the snapshot that covers it is merged below
+                continue
+            events = []
+            for line in data.splitlines(keepends=True):
+                try:
+                    if not line.endswith(b'\n'):
+                        # Still being written, or torn by a crash: nothing after it was committed
+                        raise ValueError("unterminated line")
+                    events.append(json.loads(line))
+                except ValueError:
+                    if initial:
+                        torn += 1
+                    break
+                offset += len(line)
+            self._offsets[name] = offset
+            with self._lock:
+                for event in events:
+                    if event['seq'] <= self._applied.get(writer, 0):
+                        continue
+                    self._apply(event['session'], event['state'], event['t'])
+                    self._applied[writer] = event['seq']
+                    applied += 1
+        if not initial:
+            self._load_snapshot()
+        return applied, torn
+
+    def catch_up(self):
+        """Apply what other writers have appended since the last call; returns the number of events."""
+        with self._read_lock:
+            return self._read_segments()[0]
+
+    def _apply(self, session, state, t):
+        entry = self._sessions.get(session)
+        if entry is None:
+            entry = self._sessions[session] = {'state': {}, 'times': {}, 'updated': t}
+        entry['updated'] = max(entry['updated'], t)
+        for key, value in state.items():
+            # Another writer's events can be read late; keep the newest value of each key
+            if t >= entry['times'].get(key, 0.0):
+                entry['state'][key] = json.dumps(value)
+                entry['times'][key] = t
+
+    # Writing ----------------------------------------------------------------
+
+    def append(self, session, kind, state=None, data=None, durable=False):
+        """Record an event; returns its sequence number (per writer).
+
+        ``state`` maps session-state keys to their new (JSON-serialisable)
+        values.  The event is visible to ``restore`` at once and reaches disk
+        with the next group commit; with ``durable=True`` this call waits for
+        that commit, and raises ``OSError`` if it failed.
+        """
+        if self.readonly:
+            raise RuntimeError("Event log was opened read-only")
+        state = state or {}
+        t = time.time()
+        done = _Commit() if durable else None
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            line = json.dumps({'seq': seq, 't': t, 'session': session, 'kind': kind,
+                               'state': state, 'data': data or {}}, separators=(',', ':'))
+            self._apply(session, state, t)
+            self._since_snapshot += 1
+            # Queued under the lock so lines reach the file in sequence order
+            self._queue.put((line, done))
+        if done is not None:
+            done.wait()
+        return seq
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            closing = False
+            # Everything that queued up while the last fsync ran goes into this commit
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            # Flush markers carry no line
+            data = ''.join(line + '\n' for line, _ in batch if line is not None).encode('utf-8')
+            error = None
+            try:
+                if self._segment is None:
+                    self._segment = open(self._segment_path, 'ab')
+                self._segment.write(data)
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+                self._segment_size += len(data)
+                self.commits += 1
+                self.committed_events += len(batch)
+            except OSError as exc:
+                error = exc
+                self._rollback()
+            for _, done in batch:
+                if done is not None:
+                    done.error = error
+                    done.event.set()
+            if self._since_snapshot >= self.snapshot_every:
+                try:
+                    self.snapshot()
+                except OSError:
+                    # Retried after another snapshot_every events
+                    pass
+            if closing:
+                break
+
+    def _rollback(self):
+        # Cut a partly written batch off so the segment still ends on a complete line
+        try:
+            self._segment.close()
+        except OSError:
+            pass
+        self._segment = None
+        try:
+            os.truncate(self._segment_path, self._segment_size)
+            self._segment = open(self._segment_path, 'ab')
+        except OSError:
+            # Reopened by the next write
+            pass
+
+    def flush(self):
+        """Wait until every event appended so far is on disk; raises ``OSError`` if a write failed."""
+        done = _Commit()
+        with self._lock:
+            self._queue.put((None, done))
+        done.wait()
+
+    # Snapshots --------------------------------------------------------------
+
+    def snapshot(self):
+        """Write all live sessions to a snapshot and drop the segments it covers.
+
+        Only the process holding ``LOCK`` writes snapshots; others return
+        None after dropping idle sessions, starting a new segment and deleting
+        their own segments that the newest snapshot covers.  Runs on the
+        writer thread (or with the writer stopped), so no segment write can
+        interleave with the switch to a new segment.
+        """
+        if self._compactor_lock is None:
+            self._compactor_lock = _try_lock(os.path.join(self.directory, 'LOCK'))
+        if self._compactor_lock is None:
+            # Merges the newest snapshot, which records how far it covers this writer's events
+            self.catch_up()
+            with self._lock:
+                self._drop_idle(time.time())
+                seq, covered = self._seq, self._applied.get(self.writer, 0)
+                self._since_snapshot = 0
+            self._rotate(seq, covered)
+            return None
+        # Writers that have exited (their lock is free): their segments can go once read.  A writer
+        # takes its lock before creating its first segment, so a new one is never mistaken for exited.
+        exited = {}
+        writers = {_segment_writer(n) for n in os.listdir(self.directory)
+                   if n.startswith('events-') and n.endswith('.log')}
+        for writer in writers - {self.writer, ''}:
+            lock = _try_lock(os.path.join(self.directory, _writer_lock_name(writer)))
+            if lock is not None:
+                exited[writer] = lock
+        self.catch_up()
+
+        now = time.time()
+        with self._lock:
+            self._drop_idle(now)
+            sessions = {session: {'updated': entry['updated'], 'times': dict(entry['times']),
+                                  'state': {key: json.loads(value) for key, value in entry['state'].items()}}
+                        for session, entry in self._sessions.items()}
+            writer_seqs = dict(self._applied, **{self.writer: self._seq})
+            self._since_snapshot = 0
+        name = _snapshot_name(now)
+        tmp = os.path.join(self.directory, name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'writer_seqs': writer_seqs, 'created': now, 'sessions': sessions}, f,
+                      separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.directory, name))
+        _fsync_dir(self.directory)
+        self._snapshot = name
+
+        self._rotate(writer_seqs[self.writer], writer_seqs[self.writer])
+        for old in os.listdir(self.directory):
+            if old.startswith('events-') and old.endswith('.log'):
+                writer = _segment_writer(old)
+                if writer in exited or writer == '':
+                    os.remove(os.path.join(self.directory, old))
+                    self._offsets.pop(old, None)
+            elif old.startswith('snapshot-') and old != name:
+                os.remove(os.path.join(self.directory, old))
+        for writer, lock in exited.items():
+            # Closed first: Windows cannot delete an open file
+            lock.close()
+            os.remove(os.path.join(self.directory, _writer_lock_name(writer)))
+        return name
+
+    def _drop_idle(self, now):
+        # Called with self._lock held
+        for session in [s for s, e in self._sessions.items() if now - e['updated'] > self.max_age]:
+            del self._sessions[session]
+
+    def _rotate(self, seq, covered):
+        """Start a new segment after ``seq`` and delete this writer's segments whose events are all <= ``covered``."""
+        if self._segment_size:
+            # Events still queued have seq <= ``seq``; they land in the new segment, which stays until covered
+            if self._segment is not None:
+                self._segment.close()
+            self._segment_path = os.path.join(self.directory, _segment_name(self.writer, seq + 1))
+            self._segment = open(self._segment_path, 'ab')
+            self._segment_size = 0
+        own = sorted(n for n in os.listdir(self.directory)
+                     if n.startswith('events-') and n.endswith('.log') and _segment_writer(n) == self.writer)
+        current = os.path.basename(self._segment_path)
+        # A segment's events end before the first seq of the segment after it
+        for name, following in zip(own, own[1:]):
+            if name != current and int(following[:-len('.log')].rpartition('-')[2]) - 1 <= covered:
+                os.remove(os.path.join(self.directory, name))
+
+    # Reading ----------------------------------------------------------------
+
+    def restore(self, session):
+        """The latest recorded state of ``session`` as fresh objects, or None if unknown.
+
+        Events other writers have appended since the last look are read first.
+        """
+        self.catch_up()
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None:
+                return None
+            return {key: json.loads(value) for key, value in entry['state'].items()}
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'seq': self._seq, 'writer': self.writer,
+                    'compactor': not self.readonly and self._compactor_lock is not None,
+                    'commits': self.commits, 'committed_events': self.committed_events,
+                    'since_snapshot': self._since_snapshot, 'recovery': self.recovery}
+
+    def close(self):
+        if self.readonly:
+            return
+        self._queue.put(None)
+        self._writer_thread.join()
+        if self._segment is not None:
+            self._segment.close()
+        # Nothing written: leave no files behind
+        empty = self._segment_size == 0 and os.path.exists(self._segment_path)
+        if empty:
+            os.remove(self._segment_path)
+        if self._compactor_lock is not None:
+            self._compactor_lock.close()
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+        if empty:
+            # Only once closed: Windows cannot delete an open file
+            os.remove(os.path.join(self.directory, _writer_lock_name(self.writer)))
+
+
+def record_changes(log, session, state, tracked, recorded):
+    """Append one event per kind for the ``tracked`` keys of ``state`` that changed.
+
+    ``tracked`` maps session-state keys to event kinds; ``recorded`` is a dict
+    kept alongside the session holding the JSON text last logged for each key.
+    """
+    changes = {}
+    for key, kind in tracked.items():
+        if key not in state:
+            continue
+        text = json.dumps(state[key])
+        if recorded.get(key) != text:
+            recorded[key] = text
+            changes.setdefault(kind, {})[key] = state[key]
+    for kind, values in changes.items():
+        log.append(session, kind, values)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The process-wide event log, opened (and recovered) on first use."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = EventLog()
+    return _log
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact the session event log.")
+    parser.add_argument('--dir', default=LOG_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    show_parser = sub.add_parser('show', help="Print the recovered state of a session")
+    show_parser.add_argument('session')
+    sub.add_parser('compact', help="Write a snapshot and delete the segments it covers")
+    args = parser.parse_args(argv)
+
+    log = EventLog(args.dir, readonly=args.command == 'show')
+    recovery = log.recovery
+    print(f"Recovered {recovery['sessions']} sessions ({recovery['replayed']} events replayed"
+          f" after {recovery['snapshot'] or 'no snapshot'}) in {recovery['seconds'] * 1000:.1f} ms")
+    if args.command == 'show':
+        print(json.dumps(log.restore(args.session), indent=2))
+    elif args.command == 'compact':
+        name = log.snapshot()
+        print(f"Wrote {name}" if name else "Another process holds the log's LOCK and compacts it")
+    log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Export a scaler-free, compiled copy of the model for serving.
+
+Only the winning forest is kept from the ``GridSearchCV`` in ``model.pkl``,
+and the ``StandardScaler`` in ``scaler.pkl`` is folded into its split
+thresholds, producing a model that works directly on the raw 0-1 test
+scores.  It is written as a flat ``.forest`` file (see ``forest_engine``)
+that the app and services memory-map instead of unpickling.
+
+Before the file is written, the folded model is checked against
+``model.predict(scaler.transform(X))`` on ``labelled_dysx.csv``, on every
+point of a 0.05-spaced grid sample, on a dense uniform random sample and on
+the exact split boundaries; the export is refused on any mismatch.
+
+The app uses ``model.forest`` automatically when it exists (or set
+``DYSLEXIA_MODEL_PATH`` to the exported file).
+
+Usage:
+    python export_model.py --output model.forest
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ArtifactCache
+from forest_engine import compile_model, fold_scaler, read_header
+
+# The exact feature names used during training
+columns = ['Language_vocab', 'Memory', 'Speed', 'Visual_discrimination', 'Audio_Discrimination', 'Survey_Score']
+
+
+def verification_inputs(folded, data_path='labelled_dysx.csv', n_random=1_000_000, seed=0):
+    """Yield (name, raw inputs) pairs the folded model is checked on."""
+    rng = np.random.default_rng(seed)
+    yield 'labelled_dysx.csv', pd.read_csv(data_path, encoding='utf-8-sig')[columns].to_numpy(dtype=np.float64)
+    yield 'grid sample', rng.integers(0, 21, size=(n_random // 4, len(columns))) / 20
+    yield 'uniform random', rng.random((n_random, len(columns)))
+
+    # Each split threshold and its float64 neighbours, on random base rows
+    internal = folded.left != np.arange(len(folded.left))
+    features = folded.feature[internal]
+    thresholds = folded.threshold[internal]
+    for name, values in [('split thresholds', thresholds),
+                         ('just above thresholds', np.nextafter(thresholds, np.inf)),
+                         ('just below thresholds', np.nextafter(thresholds, -np.inf))]:
+        X = rng.random((len(values), len(columns)))
+        X[np.arange(len(values)), features] = values
+        yield name, X
+
+
+def verify(model, scaler, folded, **kwargs):
+    """Compare folded and original predictions; returns a list of (name, rows, mismatches)."""
+    report = []
+    for name, X in verification_inputs(folded, **kwargs):
+        expected = model.predict(scaler.transform(pd.DataFrame(X, columns=columns)))
+        mismatches = int(np.count_nonzero(folded.predict(X) != expected))
+        report.append((name, len(X), mismatches))
+    return report
+
+
+def export(model_path='model.pkl', scaler_path='scaler.pkl', output='model.forest',
+           data_path='labelled_dysx.csv', n_random=1_000_000):
+    """Fold, verify and write ``output``; returns the verification report.
+
+    Nothing is written when any check has a mismatch.
+    """
+    bundle = ArtifactCache(model_path, scaler_path).current()
+    folded = fold_scaler(compile_model(bundle.model), bundle.scaler)
+    report = verify(bundle.model, bundle.scaler, folded, data_path=data_path, n_random=n_random)
+    if any(mismatches for _, _, mismatches in report):
+        return report
+    folded.save(output, metadata={
+        'model_version': bundle.version,
+        'columns': columns,
+        'scaler': {'mean': bundle.scaler.mean_.tolist(), 'scale': bundle.scaler.scale_.tolist()},
+    })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold the scaler into the forest and export it.")
+    parser.add_argument('--model', default='model.pkl')
+    parser.add_argument('--scaler', default='scaler.pkl')
+    parser.add_argument('--data', default='labelled_dysx.csv', help="Labelled data used for verification")
+    parser.add_argument('--samples', type=int, default=1_000_000, help="Random rows used for verification")
+    parser.add_argument('--output', default='model.forest')
+    args = parser.parse_args(argv)
+
+    report = export(args.model, args.scaler, args.output, args.data, args.samples)
+    for name, rows, mismatches in report:
+        print(f"{name:>24}: {rows:>9} rows, {mismatches} mismatches")
+    if any(mismatches for _, _, mismatches in report):
+        print("Folded model does not match the original; nothing written.", file=sys.stderr)
+        sys.exit(1)
+    version = read_header(args.output)['metadata']['model_version']
+    print(f"Wrote scaler-free model to {args.output} (model version {version})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""Array-compiled inference for the tuned RandomForest.
+
+``GridSearchCV.predict`` validates its input and then walks every tree with a
+separate Python-level call.  ``CompiledForest`` flattens all trees of the
+forest into one set of contiguous node arrays and advances every
+(row, tree) pair together, one tree level per NumPy step.
+
+The arithmetic mirrors scikit-learn so the labels are identical:
+inputs are compared as float32 against float64 thresholds, each leaf holds
+the tree's normalised class distribution, and the per-tree distributions
+are summed in tree order before averaging and taking the argmax.
+
+``CompiledForest.save`` writes a flat ``.forest`` file: a small JSON header
+followed by the raw node arrays.  ``load`` memory-maps it, so opening a
+model costs one header read, worker processes on a host share the same
+physical pages, and no pickled objects are ever deserialised.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+# Compiled model file: MAGIC, format version and header length (uint32 each),
+# a JSON header, then the node arrays at 64-byte aligned offsets
+MAGIC = b'DYSXFRST'
+FORMAT_VERSION = 1
+_prefix = struct.Struct('<II')
+_ALIGNMENT = 64
+
+
+def _align(n):
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def read_header(path, with_offset=False):
+    """JSON header of a compiled model file (and where its array data starts)."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a compiled forest file")
+        version, length = _prefix.unpack(f.read(_prefix.size))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported compiled forest format version {version}")
+        header = json.loads(f.read(length))
+    if with_offset:
+        return header, _align(len(MAGIC) + _prefix.size + length)
+    return header
+
+
+def _forest_of(model):
+    # Accept either the GridSearchCV stored in model.pkl or a bare forest
+    return getattr(model, 'best_estimator_', model)
+
+
+class CompiledForest:
+    """All trees of a forest stored as flat node arrays.
+
+    Node ``i`` splits on ``feature[i]`` at ``threshold[i]`` and continues to
+    ``left[i]`` when the value is less than or equal to the threshold,
+    otherwise to ``right[i]``.  Leaves point to themselves, so walking
+    ``max_depth`` levels always ends on a leaf.  ``value[i]`` is the class
+    distribution of node ``i`` and ``roots`` holds the root node of each tree.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth,
+                 n_features, cast_float32=True):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.classes = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        # scikit-learn compares float32 copies of the inputs
+        self.cast_float32 = cast_float32
+        # Batches up to this many rows walk all trees at once, larger ones tree by tree
+        self.small_batch = 64
+        # Header metadata of a loaded compiled file
+        self.metadata = {}
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def save(self, path, metadata=None):
+        """Write the forest as a flat, memory-mappable file (see ``read_header``).
+
+        ``metadata`` (JSON-serialisable) is stored in the header, e.g. the
+        model version and the scaler that was folded in.  The file is written
+        under a temporary name and renamed over ``path``: processes that have
+        the old file mapped keep reading it intact.
+        """
+        arrays = {'feature': self.feature.astype('<i8'), 'left': self.left.astype('<i8'),
+                  'right': self.right.astype('<i8'), 'roots': self.roots.astype('<i8'),
+                  'threshold': self.threshold.astype('<f8'), 'value': self.value.astype('<f8')}
+        header = {
+            'classes': self.classes.tolist(), 'max_depth': self.max_depth,
+            'n_features': self.n_features, 'cast_float32': bool(self.cast_float32),
+            'metadata': metadata or {}, 'arrays': {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = _align(len(MAGIC) + _prefix.size + len(header_bytes))
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + _prefix.pack(FORMAT_VERSION, len(header_bytes)) + header_bytes)
+            for name, array in arrays.items():
+                f.seek(data_start + header['arrays'][name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Open a forest written by ``save``; the node arrays are memory-mapped, not copied."""
+        header, data_start = read_header(path, with_offset=True)
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            start = data_start + spec['offset']
+            count = int(np.prod(spec['shape']))
+            arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+        forest = cls(
+            arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+            arrays['value'], arrays['roots'], np.asarray(header['classes']), header['max_depth'],
+            header['n_features'], cast_float32=header['cast_float32'],
+        )
+        forest.metadata = header['metadata']
+        return forest
+
+    @classmethod
+    def from_sklearn(cls, model):
+        forest = _forest_of(model)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        n_classes = len(forest.classes_)
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+            # Same normalisation as DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.array(roots), forest.classes_,
+            max_depth, forest.n_features_in_,
+        )
+
+    def _prepare(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if self.cast_float32:
+            X = X.astype(np.float32).astype(np.float64)
+        return X
+
+    def _apply_all(self, X, roots):
+        # Every (row, tree) pair advanced together; best for a few rows
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(roots, (X.shape[0], len(roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def _iter_tree_leaves(self, X, roots):
+        # One tree at a time over all rows; keeps the working set small for big batches
+        n = X.shape[0]
+        columns = np.ascontiguousarray(X.T).ravel()
+        rows = np.arange(n)
+        for root in roots:
+            nodes = np.full(n, root)
+            for _ in range(self.max_depth):
+                go_left = columns[self.feature[nodes] * n + rows] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            yield nodes
+
+    def apply(self, X, roots=None):
+        """Leaf node index reached by every row in every tree, shape (n_rows, n_trees)."""
+        X = self._prepare(X)
+        roots = self.roots if roots is None else roots
+        if X.shape[0] <= self.small_batch:
+            return self._apply_all(X, roots)
+        return np.stack(list(self._iter_tree_leaves(X, roots)), axis=1)
+
+    def predict_proba(self, X):
+        X = self._prepare(X)
+        if X.shape[0] <= self.small_batch:
+            leaves = self._apply_all(X, self.roots)
+            # Sequential sum over trees (axis 1) matches the forest's accumulation order
+            summed = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        else:
+            summed = np.zeros((X.shape[0], self.value.shape[1]))
+            for leaves in self._iter_tree_leaves(X, self.roots):
+                summed += self.value[leaves]
+        return summed / self.n_trees
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def predict_early_exit(self, X, block_size=8):
+        """Labels identical to ``predict``, stopping each row once its vote is decided.
+
+        Each tree adds a class distribution summing to 1, so with ``r`` trees
+        left no class can gain more than ``r`` on the leader, and a row stops
+        as soon as the leader's lead over the runner-up exceeds that.  No row
+        can be decided before more than half of the trees are in, so the
+        first block is that half; after it the remaining trees go in blocks
+        of ``block_size``.  Running sums are accumulated in tree order, so
+        rows that go to the end get exactly ``predict_proba``'s sums.
+
+        Returns (labels, trees evaluated per row).  Stopped rows drop out of
+        the tree walk, which pays off on large batches; a single row is
+        faster through ``predict``.
+        """
+        X = self._prepare(X)
+        n_trees = self.n_trees
+        summed = np.zeros((X.shape[0], self.value.shape[1]))
+        evaluated = np.zeros(X.shape[0], dtype=np.intp)
+        active = np.arange(X.shape[0])
+        # Rounding in the running sums is many orders of magnitude below this
+        slack = 1e-9 * n_trees
+        stops = list(range(n_trees // 2 + 1, n_trees, block_size)) + [n_trees]
+        start = 0
+        for stop in stops:
+            roots = self.roots[start:stop]
+            rows = X[active]
+            if len(active) <= self.small_batch:
+                leaves = self._apply_all(rows, roots)
+                # Running sum continued through this block's trees, in order
+                block = np.concatenate([summed[active][:, np.newaxis], self.value[leaves]], axis=1)
+                sums = np.cumsum(block, axis=1)[:, -1]
+            else:
+                sums = summed[active]
+                for leaves in self._iter_tree_leaves(rows, roots):
+                    sums += self.value[leaves]
+            summed[active] = sums
+            evaluated[active] = stop
+            start = stop
+            if stop == n_trees:
+                break
+            top = np.sort(sums, axis=1)
+            decided = top[:, -1] - top[:, -2] > (n_trees - stop) + slack
+            active = active[~decided]
+            if not len(active):
+                break
+        return self.classes.take(np.argmax(summed, axis=1)), evaluated
+
+
+def compile_model(model):
+    return CompiledForest.from_sklearn(model)
+
+
+def _raw_thresholds(threshold, mean, scale, cast_float32, iterations=200):
+    """Largest raw value ``x`` that still goes left at each scaled ``threshold``.
+
+    The original split tests ``(x - mean) / scale <= threshold`` (after the
+    float32 cast when ``cast_float32``).  That test is monotone in ``x``, so
+    it is true exactly for ``x <= r`` for some float64 ``r``; ``r`` is found
+    by bisection down to adjacent floats, which makes the folded comparison
+    exact for every float64 input rather than merely close.
+    """
+    def goes_left(x):
+        scaled = (x - mean) / scale
+        if cast_float32:
+            scaled = scaled.astype(np.float32).astype(np.float64)
+        return scaled <= threshold
+
+    guess = threshold * scale + mean
+    width = 1e-6 * (np.abs(guess) + scale)
+    lo, hi = guess - width, guess + width
+    # Widen the bracket until lo goes left and hi goes right
+    for _ in range(64):
+        bad_lo, bad_hi = ~goes_left(lo), goes_left(hi)
+        if not (bad_lo.any() or bad_hi.any()):
+            break
+        width = width * 2
+        lo = np.where(bad_lo, lo - width, lo)
+        hi = np.where(bad_hi, hi + width, hi)
+    else:
+        raise ValueError("Could not bracket the folded thresholds")
+    for _ in range(iterations):
+        mid = lo + (hi - lo) / 2
+        left = goes_left(mid)
+        lo = np.where(left, mid, lo)
+        hi = np.where(left, hi, mid)
+        if (np.nextafter(lo, np.inf) >= hi).all():
+            break
+    return lo
+
+
+def fold_scaler(forest, scaler):
+    """Return a copy of ``forest`` that takes raw (unscaled) inputs.
+
+    Each split threshold is mapped back through the ``StandardScaler``, so
+    the folded forest gives the same result on raw scores as the original
+    forest gives on ``scaler.transform`` of those scores.
+    """
+    n = forest.n_features
+    mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n)
+    scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n)
+    if np.any(scale <= 0):
+        raise ValueError("Cannot fold a scaler with non-positive scale")
+
+    internal = forest.left != np.arange(len(forest.left))
+    threshold = forest.threshold.copy()
+    features = forest.feature[internal]
+    threshold[internal] = _raw_thresholds(
+        forest.threshold[internal], mean[features], scale[features], forest.cast_float32)
+    return CompiledForest(
+        forest.feature, threshold, forest.left, forest.right, forest.value, forest.roots,
+        forest.classes, forest.max_depth, forest.n_features, cast_float32=False,
+    )
+
+
+def compile_raw_model(model, scaler):
+    """Compiled forest with ``scaler`` folded in, taking raw test scores."""
+    return fold_scaler(compile_model(model), scaler)
+
+
+def raw_forest(bundle):
+    """Raw-input forest for an ``artifacts`` bundle.
+
+    A bundle loaded from a compiled ``.forest`` file already holds one (with
+    the scaler folded in at export time); a pickled model is compiled here.
+    """
+    if isinstance(bundle.model, CompiledForest):
+        return bundle.model
+    return compile_raw_model(bundle.model, bundle.scaler)
@@ -0,0 +1,204 @@
+"""Order-aware fuzzy matching of free-text answers against a word list.
+
+Free-text answers (the recalled word lists and the repeated sentence) are
+marked by aligning their words with the expected words:
+
+* Text is lower-cased and split on anything that is not a letter, digit or
+  apostrophe, so case, commas and extra spaces do not matter.
+* Two words match with similarity ``1 - distance / longer length`` (their
+  Levenshtein distance), counted only from ``MIN_WORD_SIMILARITY`` up, so
+  ``"hose"`` earns 0.8 of ``"house"`` while ``"dog"`` earns nothing for
+  ``"cat"``.
+* ``recalled`` is a greedy one-to-one matching regardless of order (the
+  most similar remaining pair is taken first, so it can fall short of the
+  optimal assignment when near-misses compete for one word) and ``ordered``
+  the best order-preserving alignment (a weighted longest common
+  subsequence), each divided by the number of expected words.  The credit
+  is their mean: an exact answer scores 1, a correct list in the wrong
+  order about half, and a typo costs only its share of one word.
+
+Edit distances use Myers' bit-parallel algorithm (in Hyyrö's form for global
+distance): the expected word is a bit mask per character and each answer
+character updates all cells of a DP column in a few integer operations.
+``distance_matrix`` runs the same recurrence over NumPy ``uint64`` columns
+for many answer words at once, which is what ``scoring.score_batch`` uses to
+re-score archived answers in bulk.  Both paths give the same integer
+distances, so single and batch credits are bit-identical.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+MIN_WORD_SIMILARITY = 0.6
+_word_pattern = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+
+def words(text):
+    """Lower-cased words of ``text``, punctuation and spacing removed."""
+    return _word_pattern.findall(text.lower())
+
+
+@lru_cache(maxsize=4096)
+def _char_masks(pattern):
+    masks = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def edit_distance(pattern, text):
+    """Levenshtein distance between ``pattern`` and ``text`` (bit-parallel, any length)."""
+    m = len(pattern)
+    if m == 0:
+        return len(text)
+    masks = _char_masks(pattern)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for c in text:
+        eq = masks.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # The first row of the DP counts up (global distance), so a 1 enters at the bottom
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv & full
+    return score
+
+
+def distance_matrix(patterns, texts):
+    """``edit_distance(p, t)`` for every pattern (rows) and text (columns), as an int array.
+
+    The texts are processed together, one character column at a time, so
+    the cost per pattern is a few NumPy operations per character of the
+    longest text.  Patterns longer than 64 characters use ``edit_distance``.
+    """
+    texts = list(texts)
+    out = np.zeros((len(patterns), len(texts)), dtype=np.int64)
+    if not texts:
+        return out
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    width = int(lengths.max())
+    codes = np.zeros((len(texts), max(width, 1)), dtype=np.int64)
+    for i, t in enumerate(texts):
+        codes[i, :len(t)] = [ord(c) for c in t]
+    columns = np.ascontiguousarray(codes.T)
+    one = np.uint64(1)
+
+    for row, pattern in enumerate(patterns):
+        m = len(pattern)
+        if m == 0:
+            out[row] = lengths
+            continue
+        if m > 64:
+            out[row] = [edit_distance(pattern, t) for t in texts]
+            continue
+        # Character -> bit mask lookup, sized to cover every code in the texts
+        table = np.zeros(max(int(codes.max()), max(map(ord, pattern))) + 1, dtype=np.uint64)
+        for c, mask in _char_masks(pattern).items():
+            table[ord(c)] = np.uint64(mask)
+        full = np.uint64((1 << m) - 1)
+        high = np.uint64(1 << (m - 1))
+        pv = np.full(len(texts), full, dtype=np.uint64)
+        mv = np.zeros(len(texts), dtype=np.uint64)
+        score = np.full(len(texts), m, dtype=np.int64)
+        for j in range(width):
+            active = lengths > j
+            eq = table[columns[j]]
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            score += active & ((ph & high) != 0)
+            score -= active & ((ph & high) == 0) & ((mh & high) != 0)
+            ph = (ph << one) | one
+            mh = mh << one
+            # Texts that have ended keep their final column
+            pv = np.where(active, (mh | ~(xv | ph)) & full, pv)
+            mv = np.where(active, ph & xv & full, mv)
+        out[row] = score
+    return out
+
+
+def similarity(distance, len_a, len_b):
+    """Word similarity from an edit distance; 0 below ``MIN_WORD_SIMILARITY``."""
+    longest = max(len_a, len_b)
+    if longest == 0:
+        return 1.0
+    value = 1 - distance / longest
+    return value if value >= MIN_WORD_SIMILARITY else 0.0
+
+
+def align(answer_words, expected_words, sim):
+    """Return (recalled, ordered) for ``sim[i][j]``, the similarity of answer word i to expected word j."""
+    n = len(expected_words)
+    if n == 0 or not answer_words:
+        return 0.0, 0.0
+    # Order-preserving alignment: weighted longest common subsequence
+    previous = [0.0] * (n + 1)
+    for i in range(len(answer_words)):
+        current = [0.0]
+        for j in range(n):
+            current.append(max(previous[j + 1], current[j], previous[j] + sim[i][j]))
+        previous = current
+    # One-to-one matching regardless of order, best pairs first
+    pairs = sorted(((sim[i][j], i, j) for i in range(len(answer_words)) for j in range(n) if sim[i][j] > 0),
+                   key=lambda p: (-p[0], p[1], p[2]))
+    used_answer, used_expected, recalled = set(), set(), 0.0
+    for value, i, j in pairs:
+        if i not in used_answer and j not in used_expected:
+            used_answer.add(i)
+            used_expected.add(j)
+            recalled += value
+    return recalled / n, previous[n] / n
+
+
+def credit(answer, expected):
+    """Partial credit in [0, 1] for the free-text ``answer`` against ``expected`` (text or word list)."""
+    expected_words = words(expected if isinstance(expected, str) else ' '.join(expected))
+    answer_words = words(answer)
+    sim = [[similarity(edit_distance(e, a), len(a), len(e)) for e in expected_words] for a in answer_words]
+    recalled, ordered = align(answer_words, expected_words, sim)
+    return (recalled + ordered) / 2
+
+
+def similarity_matrix(expected, answers):
+    """``similarity`` for every expected word (rows) and answer word (columns)."""
+    distances = distance_matrix(expected, answers)
+    longest = np.maximum.outer(np.fromiter(map(len, expected), dtype=np.int64, count=len(expected)),
+                               np.fromiter(map(len, answers), dtype=np.int64, count=len(answers)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = np.where(longest == 0, 1.0, 1 - distances / longest)
+    return np.where(values >= MIN_WORD_SIMILARITY, values, 0.0)
+
+
+def batch_credit(answers, expected):
+    """``credit`` for each pair of ``answers`` and ``expected``, computing each distinct word distance once."""
+    answers = [words(a) for a in answers]
+    expected = [words(e if isinstance(e, str) else ' '.join(e)) for e in expected]
+    answer_vocab = sorted({w for ws in answers for w in ws})
+    expected_vocab = sorted({w for ws in expected for w in ws})
+    answer_index = {w: k for k, w in enumerate(answer_vocab)}
+    expected_index = {w: k for k, w in enumerate(expected_vocab)}
+    # Transposed so that rows follow answer words, as in ``align``
+    sim_all = similarity_matrix(expected_vocab, answer_vocab).T
+
+    results = np.zeros(len(answers), dtype=np.float64)
+    memo = {}
+    for row, (answer_words, expected_words) in enumerate(zip(answers, expected)):
+        key = (tuple(answer_words), tuple(expected_words))
+        if key not in memo:
+            sim = sim_all[np.ix_([answer_index[a] for a in answer_words],
+                                 [expected_index[e] for e in expected_words])].tolist()
+            recalled, ordered = align(answer_words, expected_words, sim)
+            memo[key] = (recalled + ordered) / 2
+        results[row] = memo[key]
+    return results
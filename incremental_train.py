@@ -0,0 +1,233 @@
+"""Update the served Random Forest with a new batch of labelled rows.
+
+A full ``train_model.py`` run re-reads the whole history and rebuilds every
+tree.  This instead touches only the new rows, so its cost scales with the
+batch rather than with everything seen so far:
+
+* The existing trees are kept exactly as they are, and so is the
+  ``StandardScaler`` they split on.  A tree's splits do not depend on the
+  scale of its inputs, so there is nothing to gain from refitting it, and
+  moving the trees' thresholds to a new scaling would change leaves at
+  the float32 rounding of the splits.
+* New trees are grown on the batch alone, scaled with the same scaler, and
+  appended.  By default their number gives the batch the ensemble share of
+  its rows among all rows seen.
+* When the forest would exceed ``--max-trees`` (default: its current size)
+  the oldest trees are retired first, so the model tracks recent screenings.
+
+Part of the batch (``--holdout``) is kept back to compare the current and
+updated models before anything is published.  The update is written as a
+new version directory, like ``train_model.py``, whose ``metadata.json``
+records the parent version, the rows seen and which batch each tree came
+from (with the random state its trees were grown with); the next update
+continues from there.
+
+Usage:
+    python incremental_train.py confirmed_2026-10.csv --publish
+    python incremental_train.py more.csv --base models/20261018-101500-3f2a9c01d2a4b6e8 --new-trees 50
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error
+from sklearn.model_selection import train_test_split
+from sklearn.tree._tree import Tree
+
+from artifacts import MODEL_PATH, SCALER_PATH, file_digest
+from train_model import load_data, publish, save
+
+
+def _version(model_path, scaler_path):
+    # Same combined hash the app reports as the model version
+    digest = hashlib.sha256()
+    digest.update(file_digest(model_path).encode())
+    digest.update(file_digest(scaler_path).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_base(version_dir=None, models_dir='models', model_path='model.pkl', scaler_path=SCALER_PATH):
+    """(forest, scaler, metadata) of a version directory, or of the served pickles.
+
+    The served pickles get the metadata of the version directory they were
+    published from, when it is still in ``models_dir``.
+    """
+    if version_dir:
+        model_path = os.path.join(version_dir, 'model.pkl')
+        scaler_path = os.path.join(version_dir, 'scaler.pkl')
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+
+    version = _version(model_path, scaler_path)
+    if not version_dir and os.path.isdir(models_dir):
+        version_dir = next((os.path.join(models_dir, name) for name in sorted(os.listdir(models_dir))
+                            if name.endswith(f'-{version}')), None)
+    metadata = {}
+    if version_dir and os.path.exists(os.path.join(version_dir, 'metadata.json')):
+        with open(os.path.join(version_dir, 'metadata.json')) as f:
+            metadata = json.load(f)
+    metadata['version'] = version
+    # model.pkl from the notebook is the GridSearchCV; only its winning forest is updated
+    return getattr(model, 'best_estimator_', model), scaler, metadata
+
+
+def _with_classes(tree, tree_classes, classes):
+    """``tree`` with its leaf values widened to ``classes``, for a batch that lacks some labels.
+
+    Trees inside a forest predict the forest's class *indices*, so
+    ``tree_classes`` are the labels of the forest that grew ``tree`` (its
+    ``classes_``), not the tree's own ``classes_``.
+    """
+    if np.array_equal(tree_classes, classes):
+        return tree
+    state = tree.tree_.__getstate__()
+    values = np.zeros(state['values'].shape[:2] + (len(classes),))
+    values[:, :, np.searchsorted(classes, tree_classes)] = state['values']
+    tree.tree_ = Tree(tree.tree_.n_features, np.array([len(classes)], dtype=np.intp), tree.n_outputs_)
+    tree.tree_.__setstate__(dict(state, values=values))
+    tree.classes_ = np.arange(len(classes), dtype=np.float64)
+    tree.n_classes_ = len(classes)
+    return tree
+
+
+def grow_trees(X, y, classes, n_trees, random_state=0):
+    """``n_trees`` new trees grown on ``X``/``y`` alone, predicting over ``classes``."""
+    unknown = np.setdiff1d(np.unique(y), classes)
+    if len(unknown):
+        raise ValueError(f"New data has labels the model does not know: {unknown.tolist()}")
+    forest = RandomForestClassifier(n_estimators=n_trees, random_state=random_state)
+    forest.fit(X, y)
+    expected = forest.predict(X)
+    trees = [_with_classes(tree, forest.classes_, classes) for tree in forest.estimators_]
+    # The widened trees must vote for the same labels as the forest they came from
+    proba = np.mean([tree.predict_proba(X) for tree in trees], axis=0)
+    mismatched = int(np.sum(classes[np.argmax(proba, axis=1)] != expected))
+    if mismatched:
+        raise RuntimeError(f"Trees grown on the batch mispredict {mismatched} of its rows over the model's classes")
+    return trees
+
+
+def _batches(model, metadata):
+    """Which batch each tree came from, oldest first: [{'batch', 'trees', 'rows'}, ...]."""
+    if 'tree_batches' in metadata:
+        return [dict(batch) for batch in metadata['tree_batches']]
+    return [{'batch': metadata.get('data', 'initial'), 'trees': len(model.estimators_),
+             'rows': metadata.get('rows')}]
+
+
+def rows_seen(scaler, metadata):
+    """Rows the model has been trained on so far."""
+    return int(metadata.get('rows_seen', np.max(scaler.n_samples_seen_)))
+
+
+def update(model, scaler, X, y, metadata=None, new_trees=None, max_trees=None, batch='batch',
+           random_state=None):
+    """Add trees grown on the rows ``X``/``y`` to ``model``; returns (model, tree batches, trees grown).
+
+    ``scaler`` is not changed: the new trees are grown on ``X`` scaled with
+    it.  The random state used (by default, from the clock) is recorded in
+    the new batch.
+    """
+    metadata = metadata or {}
+    kept = list(model.estimators_)
+    if new_trees is None:
+        new_trees = max(1, round(len(kept) * len(X) / (rows_seen(scaler, metadata) + len(X))))
+    if random_state is None:
+        random_state = int(time.time())
+    grown = grow_trees(scaler.transform(X), np.asarray(y), model.classes_, new_trees, random_state)
+
+    batches = _batches(model, metadata) + [{'batch': batch, 'trees': len(grown), 'rows': int(len(X)),
+                                            'random_state': random_state}]
+    trees = kept + grown
+    retire = max(0, len(trees) - (max_trees or len(model.estimators_)))
+    trees = trees[retire:]
+    # Retired trees come off the oldest batches
+    while retire:
+        taken = min(retire, batches[0]['trees'])
+        batches[0]['trees'] -= taken
+        retire -= taken
+        if batches[0]['trees'] == 0:
+            batches.pop(0)
+
+    updated = copy.copy(model)
+    updated.estimators_ = trees
+    updated.set_params(n_estimators=len(trees))
+    return updated, batches, len(grown)
+
+
+def _scores(model, scaler, X, y):
+    predicted = model.predict(scaler.transform(X))
+    return {
+        'mean_absolute_error': round(float(mean_absolute_error(y, predicted)), 3),
+        'f1_macro': round(float(f1_score(y, predicted, average='macro')), 3),
+        'accuracy': round(float(accuracy_score(y, predicted)), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add trees trained on a new batch of labelled rows.")
+    parser.add_argument('data', help="CSV with the six score columns and a Label column")
+    parser.add_argument('--base', help="Version directory to update (default: the served model.pkl/scaler.pkl)")
+    parser.add_argument('--new-trees', type=int, help="Trees to grow on the batch (default: its share of rows)")
+    parser.add_argument('--max-trees', type=int, help="Retire the oldest trees beyond this (default: current size)")
+    parser.add_argument('--holdout', type=float, default=0.2, help="Part of the batch kept back for evaluation")
+    parser.add_argument('--random-state', type=int)
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--publish', action='store_true', help="Also replace the served model")
+    args = parser.parse_args(argv)
+
+    model, scaler, base_metadata = load_base(args.base, args.models_dir)
+    X, y = load_data(args.data)
+    if args.holdout:
+        X_fit, X_test, y_fit, y_test = train_test_split(X, y, test_size=args.holdout, random_state=10)
+    else:
+        X_fit, X_test, y_fit, y_test = X, None, y, None
+
+    random_state = int(time.time()) if args.random_state is None else args.random_state
+    start = time.perf_counter()
+    updated, batches, grown = update(model, scaler, X_fit, y_fit, base_metadata, args.new_trees,
+                                     args.max_trees, os.path.basename(args.data), random_state)
+    update_seconds = time.perf_counter() - start
+
+    metadata = {
+        'data': os.path.basename(args.data),
+        'data_sha256': file_digest(args.data),
+        'rows': int(len(X_fit)),
+        'rows_seen': rows_seen(scaler, base_metadata) + int(len(X_fit)),
+        'parent_version': base_metadata['version'],
+        'random_state': random_state,
+        'tree_batches': batches,
+        'n_estimators': len(updated.estimators_),
+        'update_seconds': round(update_seconds, 3),
+        'sklearn_version': sklearn.__version__,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    if X_test is not None:
+        metadata['test_metrics'] = _scores(updated, scaler, X_test, y_test)
+        metadata['parent_test_metrics'] = _scores(model, scaler, X_test, y_test)
+
+    print(f"Grew {grown} trees on {len(X_fit)} rows in {update_seconds:.1f}s (random state {random_state}); "
+          f"forest now has {len(updated.estimators_)} trees from {len(batches)} batches")
+    if X_test is not None:
+        print(f"Hold-out ({len(X_test)} rows):")
+        for name in metadata['test_metrics']:
+            print(f"  {name}: {metadata['parent_test_metrics'][name]} -> {metadata['test_metrics'][name]}")
+
+    version_dir = save(updated, scaler, metadata, args.models_dir)
+    print(f"Wrote {version_dir}")
+    if args.publish:
+        publish(version_dir)
+        print(f"Published to {MODEL_PATH} and {SCALER_PATH}")
+
+
+if __name__ == '__main__':
+    main()
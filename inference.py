@@ -0,0 +1,147 @@
+"""Inference-only entry point: model loading, warm-up and single predictions.
+
+Importing this module pulls in NumPy and the standard library only.  With a
+compiled ``model.forest`` (see ``export_model.py``) the model is
+memory-mapped and pandas and scikit-learn are never imported; only when the
+model has to come from ``model.pkl`` does unpickling import scikit-learn,
+and then at the first ``warm_up`` rather than at import time.
+
+``warm_up()`` loads the model, compiles or maps the forest, opens the
+prediction table and runs both tree-walking code paths once, so the first
+real request does not pay for any of it.  It records how long each stage
+took in ``startup``, which is what ``python inference.py startup`` reports
+for a fresh interpreter, e.g. to track cold-start time of new replicas:
+
+    python inference.py startup --runs 5 --output startup_times.jsonl
+"""
+import time
+
+_import_started = time.perf_counter()
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import artifacts
+import lookup_table
+import metrics
+from forest_engine import raw_forest
+
+# Modules that should stay out of an inference-only process
+HEAVY_MODULES = ('pandas', 'sklearn', 'scipy')
+
+startup = {'import_seconds': time.perf_counter() - _import_started}
+_warm_version = None
+
+
+def engine(bundle=None):
+    """Raw-input compiled forest for the current (or given) model version."""
+    return artifacts.derived('raw_forest', raw_forest, bundle)
+
+
+def prediction_table(bundle=None):
+    """Prediction table built for the current model, or None (see lookup_table.py)."""
+    return artifacts.derived('prediction_table',
+                             lambda b: lookup_table.load_for(b, fallback=engine(b)), bundle)
+
+
+def predict_label(row):
+    """Class label for one row of the six raw test scores."""
+    table = prediction_table()
+    path = 'forest' if table is None else 'table'
+    started = time.perf_counter()
+    if table is not None:
+        # O(1) grid lookup, falling back to the forest for off-grid inputs
+        label = table.predict_one(row)
+    else:
+        label = int(engine().predict(np.asarray([row], dtype=np.float64))[0])
+    metrics.INFERENCE_SECONDS.observe(time.perf_counter() - started, path=path)
+    metrics.INFERENCE_ROWS.inc(path=path)
+    return label
+
+
+def _process_age():
+    # Seconds since this process started (Linux only)
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def warm_up():
+    """Load and exercise the model once per model version; returns ``startup``."""
+    global _warm_version
+    started = time.perf_counter()
+    bundle = artifacts.current()
+    if bundle.version == _warm_version:
+        return startup
+    forest = engine(bundle)
+    loaded = time.perf_counter()
+    table = prediction_table(bundle)
+    # One row and one large batch touch both tree-walking paths (and page in a mapped model)
+    rng = np.random.default_rng(0)
+    forest.predict(rng.random((1, forest.n_features)))
+    forest.predict(rng.random((forest.small_batch + 1, forest.n_features)))
+    if table is not None:
+        table.predict_one([0.5] * forest.n_features)
+    done = time.perf_counter()
+    startup.update({
+        'model_version': bundle.version,
+        'model_path': artifacts.MODEL_PATH,
+        'load_seconds': loaded - started,
+        'warm_up_seconds': done - loaded,
+        'ready_seconds': done - _import_started,
+        'process_age_seconds': _process_age(),
+        'heavy_modules': [m for m in HEAVY_MODULES if m in sys.modules],
+    })
+    metrics.MODEL_LOADS.inc()
+    metrics.MODEL_LOAD_SECONDS.set(startup['load_seconds'])
+    metrics.MODEL_WARM_UP_SECONDS.set(startup['warm_up_seconds'])
+    metrics.MODEL_INFO.clear()
+    metrics.MODEL_INFO.set(1, version=bundle.version, path=artifacts.MODEL_PATH)
+    _warm_version = bundle.version
+    return startup
+
+
+def measure_startup(runs=3):
+    """Time import + warm-up in fresh interpreters; one result dict per run."""
+    code = ('import time; t = time.perf_counter(); import inference, json; '
+            's = inference.warm_up(); s["wall_seconds"] = time.perf_counter() - t; print(json.dumps(s))')
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inference start-up measurement.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    startup_parser = sub.add_parser('startup', help="Measure cold-start time in fresh interpreters")
+    startup_parser.add_argument('--runs', type=int, default=3)
+    startup_parser.add_argument('--output', help="Append results as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    if args.command == 'startup':
+        results = measure_startup(args.runs)
+        for r in results:
+            print(f"ready in {r['wall_seconds'] * 1000:7.1f} ms  (import {r['import_seconds'] * 1000:.1f}, "
+                  f"load {r['load_seconds'] * 1000:.1f}, warm-up {r['warm_up_seconds'] * 1000:.1f})  "
+                  f"model {r['model_path']}  heavy modules: {', '.join(r['heavy_modules']) or 'none'}")
+        if args.output:
+            with open(args.output, 'a') as f:
+                for r in results:
+                    f.write(json.dumps(dict(r, measured_at=time.time())) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""Asyncio HTTP service for the dyslexia model with request micro-batching.
+
+Concurrent requests are queued and coalesced into micro-batches: a batch is
+sent to the model as soon as ``max_batch_size`` requests are waiting or the
+oldest one has waited ``max_wait_ms``.  Each batch is scaled and scored with
+a single vectorized call, using the same scaler-folded forest as
+``predict_dyslexia`` in ``app.py``.
+
+Endpoints:
+    POST /predict   {"Language_vocab": 0.5, ..., "Survey_Score": 0.7}
+                    or {"features": [0.5, 0.6, 0.5, 0.8, 0.6, 0.7]}
+    GET  /health
+    GET  /stats     queueing and inference latency summaries
+    GET  /metrics   the same latencies in the Prometheus text format
+
+Usage:
+    python inference_service.py serve --port 8600 --max-batch-size 64 --max-wait-ms 5
+    python inference_service.py loadtest --url http://127.0.0.1:8600 --concurrency 64 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import artifacts
+import inference
+import metrics
+
+# The exact feature names used during training
+columns = ['Language_vocab', 'Memory', 'Speed', 'Visual_discrimination', 'Audio_Discrimination', 'Survey_Score']
+
+# Model labels as interpreted by predict_dyslexia in app.py
+risk_levels = {0: 'high', 1: 'moderate', 2: 'low'}
+
+
+def predict_batch(X):
+    """Score a (n_rows, 6) array of raw scores; returns (labels, proba)."""
+    engine = inference.engine()
+    with metrics.INFERENCE_SECONDS.time(path='batch'):
+        proba = engine.predict_proba(X)
+    metrics.INFERENCE_ROWS.inc(len(X), path='batch')
+    return engine.classes.take(np.argmax(proba, axis=1)), proba
+
+
+class SampleWindow:
+    """Keeps the most recent samples for percentile reporting."""
+
+    def __init__(self, size=10_000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self, scale=1000.0, suffix='_ms'):
+        # Latencies are recorded in seconds and reported in milliseconds by default
+        if not self.samples:
+            return {'count': self.count}
+        data = np.fromiter(self.samples, dtype=np.float64) * scale
+        p50, p95, p99 = np.percentile(data, [50, 95, 99])
+        return {'count': self.count, 'mean' + suffix: round(float(data.mean()), 3),
+                'p50' + suffix: round(float(p50), 3), 'p95' + suffix: round(float(p95), 3),
+                'p99' + suffix: round(float(p99), 3), 'max' + suffix: round(float(data.max()), 3)}
+
+
+class MicroBatcher:
+    """Coalesces single-row requests into batched model calls."""
+
+    def __init__(self, max_batch_size=64, max_wait_ms=5.0, predict=predict_batch):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.predict = predict
+        self.queue = asyncio.Queue()
+        # One thread keeps inference off the event loop without reordering batches
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue_latency = SampleWindow()
+        self.inference_latency = SampleWindow()
+        self.batch_sizes = SampleWindow()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, time.perf_counter(), future))
+        return await future
+
+    async def _collect(self):
+        # Wait for the first request, then fill the batch until it is full or the wait expires
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            for _, enqueued, _ in batch:
+                self.queue_latency.add(started - enqueued)
+            X = np.array([row for row, _, _ in batch], dtype=np.float64)
+            try:
+                labels, proba = await loop.run_in_executor(self.executor, self.predict, X)
+            except Exception as exc:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            inference = time.perf_counter() - started
+            self.inference_latency.add(inference)
+            self.batch_sizes.add(len(batch))
+            for i, (_, enqueued, future) in enumerate(batch):
+                if future.done():
+                    continue
+                future.set_result({
+                    'label': int(labels[i]),
+                    'risk': risk_levels.get(int(labels[i]), str(labels[i])),
+                    'probabilities': [round(float(p), 6) for p in proba[i]],
+                    'queue_ms': round((started - enqueued) * 1000, 3),
+                    'inference_ms': round(inference * 1000, 3),
+                    'batch_size': len(batch),
+                })
+
+    def stats(self):
+        return {
+            'queue_latency': self.queue_latency.summary(),
+            'inference_latency': self.inference_latency.summary(),
+            'batch_size': self.batch_sizes.summary(scale=1, suffix=''),
+            'queued': self.queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'model_version': artifacts.current().version,
+        }
+
+
+def parse_features(payload):
+    """Return the six feature values from a request body."""
+    if isinstance(payload, dict) and 'features' in payload:
+        values = payload['features']
+    elif isinstance(payload, dict):
+        missing = [c for c in columns if c not in payload]
+        if missing:
+            raise ValueError(f"Missing features: {', '.join(missing)}")
+        values = [payload[c] for c in columns]
+    else:
+        values = payload
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError(f"Expected {len(columns)} feature values")
+    row = []
+    for name, value in zip(columns, values):
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number")
+        try:
+            value = float(value)
+        except OverflowError:
+            # A JSON integer too large for a float
+            raise ValueError(f"{name} must be between 0 and 1") from None
+        # NaN fails both comparisons, so it is rejected here too
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"{name} must be between 0 and 1, got {value}")
+        row.append(value)
+    return row
+
+
+_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+async def _write_json(writer, status, body, keep_alive):
+    await _write(writer, status, 'application/json', json.dumps(body).encode(), keep_alive)
+
+
+async def _write(writer, status, content_type, data, keep_alive):
+    head = (f"HTTP/1.1 {status} {_reasons[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode() + data)
+    await writer.drain()
+
+
+class BadRequest(Exception):
+    pass
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+async def _read_request(reader, max_body=64 * 1024):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise BadRequest("Malformed request line")
+    method, target, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise BadRequest("Invalid Content-Length") from None
+    if length < 0:
+        raise BadRequest("Invalid Content-Length")
+    if length > max_body:
+        raise PayloadTooLarge
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return method, urlsplit(target).path, body, keep_alive
+
+
+def make_handler(batcher):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except PayloadTooLarge:
+                    await _write_json(writer, 413, {'error': 'Request body too large'}, False)
+                    break
+                except BadRequest as exc:
+                    await _write_json(writer, 400, {'error': str(exc)}, False)
+                    break
+                except ValueError:
+                    # StreamReader.readline raises this for lines over its limit
+                    await _write_json(writer, 400, {'error': 'Request line or header too long'}, False)
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                if path == '/predict':
+                    if method != 'POST':
+                        await _write_json(writer, 405, {'error': 'Use POST'}, keep_alive)
+                    else:
+                        try:
+                            row = parse_features(json.loads(body or b'null'))
+                        except (ValueError, TypeError, OverflowError) as exc:
+                            await _write_json(writer, 400, {'error': str(exc)}, keep_alive)
+                        else:
+                            try:
+                                result = await batcher.submit(row)
+                            except Exception as exc:
+                                await _write_json(writer, 500, {'error': str(exc)}, keep_alive)
+                            else:
+                                await _write_json(writer, 200, result, keep_alive)
+                elif path == '/health':
+                    await _write_json(writer, 200, {'status': 'ok', 'startup': inference.startup}, keep_alive)
+                elif path == '/stats':
+                    await _write_json(writer, 200, batcher.stats(), keep_alive)
+                elif path == '/metrics':
+                    await _write(writer, 200, metrics.CONTENT_TYPE, metrics.render().encode(), keep_alive)
+                else:
+                    await _write_json(writer, 404, {'error': 'Not found'}, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(host='127.0.0.1', port=8600, max_batch_size=64, max_wait_ms=5.0):
+    # Load, compile and exercise the model before accepting traffic
+    inference.warm_up()
+    batcher = MicroBatcher(max_batch_size, max_wait_ms)
+    batcher.start()
+    server = await asyncio.start_server(make_handler(batcher), host, port)
+    print(f"Serving on http://{host}:{port} (max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+async def _client(host, port, n_requests, latencies, errors, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            body = json.dumps({'features': rng.random(len(columns)).round(2).tolist()}).encode()
+            started = time.perf_counter()
+            writer.write(b"POST /predict HTTP/1.1\r\nHost: load\r\nContent-Type: application/json\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.add(time.perf_counter() - started)
+            if b' 200 ' not in status_line:
+                errors.append(status_line.decode().strip())
+    finally:
+        writer.close()
+
+
+async def load_test(url='http://127.0.0.1:8600', concurrency=64, requests=5000, seed=0):
+    """Drive the service with ``concurrency`` keep-alive clients and report latency/throughput."""
+    parts = urlsplit(url)
+    latencies = SampleWindow(size=requests)
+    errors = []
+    # The first requests % concurrency clients send one extra request, so the total is exactly ``requests``
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(parts.hostname, parts.port, n, latencies, errors, rng)
+        for n in per_client if n
+    ])
+    elapsed = time.perf_counter() - started
+    report = {
+        'concurrency': concurrency,
+        'requests': latencies.count,
+        'errors': len(errors),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(latencies.count / elapsed, 1),
+        'latency': latencies.summary(),
+    }
+    # Server-side view: how much of the latency was queueing vs inference
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    writer.write(b"GET /stats HTTP/1.1\r\nHost: load\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    report['server'] = json.loads(response.split(b'\r\n\r\n', 1)[1])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP service for the dyslexia model.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="Run the HTTP service")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8600)
+    serve_parser.add_argument('--max-batch-size', type=int, default=64)
+    serve_parser.add_argument('--max-wait-ms', type=float, default=5.0)
+
+    load_parser = sub.add_parser('loadtest', help="Load-test a running service")
+    load_parser.add_argument('--url', default='http://127.0.0.1:8600')
+    load_parser.add_argument('--concurrency', type=int, default=64)
+    load_parser.add_argument('--requests', type=int, default=5000)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms))
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = asyncio.run(load_test(args.url, args.concurrency, args.requests))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""Concurrent-user load test for the full test flow of ``app.py``.
+
+Each virtual user is a headless ``streamlit.testing.v1.AppTest`` session
+with its own session state.  Users run the whole flow on their own thread:
+vocabulary, memory parts 1 and 2, visual discrimination, audio
+discrimination, survey and finally Predict.  Every interaction is one
+script rerun, and its wall time is recorded.
+
+For each concurrency level the harness reports rerun latency percentiles
+(overall and per step), reruns and completed flows per second, process CPU
+use and resident memory.  Results are written as JSON so runs can be
+compared between versions:
+
+    python loadtest.py run --users 1 4 16 32 --output loadtest_results/
+    python loadtest.py compare loadtest_results/a.json loadtest_results/b.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def current_rss_bytes():
+    # Current resident set size; falls back to the peak where /proc is unavailable
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        scale = 1 if platform.system() == 'Darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP_PATH)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class VirtualUser:
+    """Drives one AppTest session through the whole test, timing every rerun."""
+
+    def __init__(self, user_id, seed, think_time=0.0, accuracy=0.7, timeout=60):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.think_time = think_time
+        self.accuracy = accuracy
+        self.samples = []   # (step, seconds)
+        self.errors = []
+
+    def _rerun(self, step, action=None):
+        if self.think_time:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+        started = time.perf_counter()
+        if action is not None:
+            action()
+        self.at.run()
+        self.samples.append((step, time.perf_counter() - started))
+        if self.at.exception:
+            self.errors.append(f"{step}: {self.at.exception[0].value}")
+
+    def _button(self, label=None, key=None):
+        if key is not None:
+            return self.at.button(key=key)
+        return next(b for b in self.at.button if b.label == label)
+
+    def _click(self, step, label=None, key=None):
+        self._rerun(step, lambda: self._button(label, key).click())
+
+    def _correct(self):
+        return self.rng.random() < self.accuracy
+
+    def vocabulary(self):
+        for i, question in enumerate(self.at.session_state.selected_questions):
+            answer = question['correct_answer'] if self._correct() else self.rng.choice(question['options'])
+            self._rerun('vocabulary.answer', lambda: self.at.radio(key=f"vocab_q{i+1}").set_value(answer))
+        self._click('vocabulary.submit', "Submit Vocabulary Test")
+
+    def memory_part1(self):
+        for i, sequence in enumerate(self.at.session_state.sequences):
+            # The reveal itself runs in the browser; report it as done
+            def reveal(i=i):
+                displayed = list(self.at.session_state.memory_displayed)
+                displayed[i] = True
+                self.at.session_state.memory_displayed = displayed
+            self._rerun('memory1.reveal', reveal)
+            answer = ''.join(map(str, sequence)) if self._correct() else '000000'
+            self._rerun('memory1.answer', lambda: self.at.text_input(key=f"memory_input_{i}").input(answer))
+            self._click('memory1.submit', key=f"submit_{i}")
+        self._click('memory1.final', key="final_score_memory_button")
+
+    def memory_part2(self):
+        correct_answers = self.at.session_state.correct_answers
+        for idx, (audio_idx, _) in enumerate(self.at.session_state.selected_audios):
+            self._click('memory2.play', key=f"play_{idx}")
+            answer = " ".join(correct_answers[audio_idx]) if self._correct() else "apple"
+            self._rerun('memory2.answer', lambda: self.at.text_input(key=f"audio_input_{idx}").input(answer))
+            self._click('memory2.submit', key=f"audio_submit_{idx}")
+        self._click('memory2.final', "Submit Final Audio Test Score")
+
+    def visual(self):
+        self._rerun('visual.answer', lambda: self.at.number_input(key="letter_count").set_value(
+            3 if self._correct() else self.rng.randint(0, 12)))
+        self._click('visual.submit', "Submit Letter Identification")
+        self._rerun('visual.answer', lambda: self.at.text_input(key="spot_diff").input(
+            "b, p, q, d" if self._correct() else "b, x"))
+        self._click('visual.submit', "Submit Spot the Differences")
+        self._rerun('visual.answer', lambda: self.at.radio(key="odd_one_out").set_value(
+            "d) ■" if self._correct() else "a) ○"))
+        self._click('visual.submit', "Submit Odd One Out")
+        self._click('visual.final', "Submit Final Visual Discrimination Score")
+
+    def audio_discrimination(self):
+        expected = ["Different", "Different", "Same", "Different", "Different"]
+        for idx, answer in enumerate(expected):
+            self._click('audio.play', key=f"phoneme_play_{idx}")
+            choice = answer if self._correct() else self.rng.choice(["Same", "Different"])
+            self._rerun('audio.answer', lambda: self.at.radio(key=f"phoneme_{idx}").set_value(choice))
+        self._click('audio.play', key="rhyming_play_bake")
+        self._rerun('audio.answer', lambda: self.at.multiselect(key="rhyming_words").set_value(
+            ["Take", "Lake"] if self._correct() else ["Back"]))
+        self._click('audio.play', key="sentence_play")
+        self._rerun('audio.answer', lambda: self.at.text_input(key="sentence_repetition").input(
+            "The quick brown fox jumps over the lazy dog." if self._correct() else "The quick fox"))
+        self._click('audio.submit', "Submit Audio Discrimination Test")
+
+    def survey(self):
+        options = ["Yes", "Often", "Sometimes", "Not Often", "No"]
+        for i in range(5):
+            choice = self.rng.choice(options)
+            self._rerun('survey.answer', lambda: self.at.radio(key=f"survey_q{i+1}").set_value(choice))
+        self._click('survey.submit', "Submit Survey Test")
+
+    def predict(self):
+        self._click('predict', "Predict")
+
+    def run_flow(self):
+        self._rerun('initial_load')
+        for section in (self.vocabulary, self.memory_part1, self.memory_part2, self.visual,
+                        self.audio_discrimination, self.survey, self.predict):
+            try:
+                section()
+            except Exception as exc:
+                # Keep going so one broken step does not hide the rest of the flow
+                self.errors.append(f"{section.__name__}: {exc!r}")
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    data = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(data, [50, 95, 99])
+    return {'count': len(values), 'mean_ms': round(float(data.mean()), 3), 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3), 'max_ms': round(float(data.max()), 3)}
+
+
+def run_level(n_users, flows_per_user=1, think_time=0.0, seed=0):
+    """Run ``n_users`` concurrent virtual users and summarise the results."""
+    users = []
+    rss_samples = []
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.25):
+            rss_samples.append(current_rss_bytes())
+
+    def worker(user_index):
+        for flow in range(flows_per_user):
+            user = VirtualUser(user_index, seed=seed * 100_003 + user_index * 1_009 + flow, think_time=think_time)
+            user.run_flow()
+            users.append(user)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    sampler.join()
+
+    latencies = [seconds for user in users for _, seconds in user.samples]
+    by_step = defaultdict(list)
+    for user in users:
+        for step, seconds in user.samples:
+            by_step[step].append(seconds)
+    errors = [f"user {user.user_id}: {error}" for user in users for error in user.errors]
+    return {
+        'users': n_users,
+        'flows': len(users),
+        'reruns': len(latencies),
+        'wall_s': round(wall, 3),
+        'reruns_per_s': round(len(latencies) / wall, 2),
+        'flows_per_min': round(len(users) / wall * 60, 2),
+        'cpu_s': round(cpu, 3),
+        'cpu_utilisation': round(cpu / wall, 3),
+        'rss_peak_mb': round(max(rss_samples or [current_rss_bytes()]) / 2**20, 1),
+        'rss_end_mb': round(current_rss_bytes() / 2**20, 1),
+        'latency': _percentiles(latencies),
+        'latency_by_step': {step: _percentiles(values) for step, values in sorted(by_step.items())},
+        'errors': errors[:50],
+        'error_count': len(errors),
+    }
+
+
+def run(levels, flows_per_user=1, think_time=0.0, seed=0, output=None):
+    results = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'think_time_s': think_time,
+        'levels': [],
+    }
+    # Warm-up run so imports and artifact loading are not charged to the first level
+    VirtualUser(-1, seed).run_flow()
+    for n_users in levels:
+        level = run_level(n_users, flows_per_user, think_time, seed)
+        results['levels'].append(level)
+        lat = level['latency']
+        print(f"{n_users:>4} users: p50 {lat.get('p50_ms', 0):8.1f} ms  p95 {lat.get('p95_ms', 0):8.1f} ms  "
+              f"p99 {lat.get('p99_ms', 0):8.1f} ms  {level['reruns_per_s']:7.1f} reruns/s  "
+              f"CPU {level['cpu_utilisation']:.0%}  RSS {level['rss_peak_mb']} MB  errors {level['error_count']}")
+    if output:
+        if os.path.isdir(output) or output.endswith(os.sep):
+            os.makedirs(output, exist_ok=True)
+            output = os.path.join(output, f"loadtest_{time.strftime('%Y%m%d_%H%M%S')}_{results['git_revision']}.json")
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    return results
+
+
+def compare(path_a, path_b):
+    """Print the change in latency and throughput between two result files."""
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"A: {path_a} ({a.get('git_revision')})\nB: {path_b} ({b.get('git_revision')})")
+    levels_b = {level['users']: level for level in b['levels']}
+    for level_a in a['levels']:
+        level_b = levels_b.get(level_a['users'])
+        if level_b is None:
+            continue
+        print(f"{level_a['users']:>4} users:")
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            va, vb = level_a['latency'].get(metric, 0), level_b['latency'].get(metric, 0)
+            change = (vb - va) / va if va else 0
+            print(f"    {metric:>8}: {va:9.1f} -> {vb:9.1f} ({change:+.0%})")
+        for metric in ('reruns_per_s', 'cpu_utilisation', 'rss_peak_mb'):
+            va, vb = level_a[metric], level_b[metric]
+            change = (vb - va) / va if va else 0
+            print(f"    {metric:>15}: {va:9.2f} -> {vb:9.2f} ({change:+.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the full app flow with headless virtual users.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="Run the load test")
+    run_parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8],
+                            help="Concurrency levels to run, one after another")
+    run_parser.add_argument('--flows-per-user', type=int, default=1)
+    run_parser.add_argument('--think-time', type=float, default=0.0, help="Mean pause between interactions (s)")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default='loadtest_results/', help="JSON file or directory")
+
+    compare_parser = sub.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('a')
+    compare_parser.add_argument('b')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args.users, args.flows_per_user, args.think_time, args.seed, args.output)
+    else:
+        compare(args.a, args.b)
+
+
+if __name__ == '__main__':
+    main()
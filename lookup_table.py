@@ -0,0 +1,225 @@
+"""Precomputed prediction table over the discrete score grid.
+
+Five of the six model inputs can only take a handful of values, because of
+how ``scoring`` computes them:
+
+    Language_vocab          k / 10 for k correct vocabulary answers
+    Memory                  k / 5
+    Visual_discrimination   average of the letter, spot-the-difference and
+                            odd-one-out scores
+    Audio_Discrimination    phoneme + rhyme + stress + sentence score (the grid
+                            holds empty and exact sentences; partial
+                            sentence credit falls back to the model)
+    Survey_Score            raw / 20
+
+Only ``Speed`` is continuous.  It is split into bins of ``speed_step``,
+further cut at the forest's own Speed split points so that every speed in a
+bin gets the same prediction.  The table holds the class index for every
+grid cell and is stored as a ``.npy`` file that is memory-mapped on load,
+with a JSON sidecar describing the axes.  Inputs off the grid fall back to
+the full model.
+
+Usage:
+    python lookup_table.py --speed-step 0.05 --output prediction_table
+"""
+import argparse
+import bisect
+import json
+import os
+import time
+
+import numpy as np
+
+import scoring
+
+columns = scoring.columns
+SPEED = columns.index('Speed')
+
+
+def vocab_values():
+    return sorted({scoring.vocabulary_score(['x'] * k + [''] * (10 - k), ['x'] * 10) for k in range(11)})
+
+
+def memory_values():
+    return sorted({scoring.memory_sequences_score([1] * k + [0] * (5 - k)) for k in range(6)})
+
+
+def survey_values():
+    return sorted({raw / scoring.SURVEY_MAX for raw in range(scoring.SURVEY_MAX + 1)})
+
+
+def visual_values():
+    values = set()
+    for count_d in range(13):
+        letter = scoring.letter_identification_score(count_d)
+        for correct in range(len(scoring.CORRECT_DIFFERENCES) + 1):
+            spot = scoring.spot_differences_score(', '.join(scoring.CORRECT_DIFFERENCES[:correct]))[0]
+            for odd in (0, 1):
+                values.add(scoring.visual_score(letter, spot, odd))
+    return sorted(values)
+
+
+def audio_values():
+    values = set()
+    phoneme_answers = [answer for _, _, answer in scoring.PHONEME_QUESTIONS]
+    for n_phoneme in range(len(phoneme_answers) + 1):
+        phonemes = phoneme_answers[:n_phoneme] + [scoring.NO_ANSWER] * (len(phoneme_answers) - n_phoneme)
+        for n_rhymes in range(len(scoring.RHYMING_CORRECT) + 1):
+            for stress in (scoring.NO_ANSWER, scoring.STRESS_CORRECT):
+                for sentence in ('', scoring.SENTENCE_CORRECT):
+                    values.add(float(scoring.audio_discrimination_scores(
+                        phonemes, scoring.RHYMING_CORRECT[:n_rhymes], stress, sentence)['total']))
+    return sorted(values)
+
+
+def grid_axes():
+    """Grid values for every feature except Speed, keyed by column name."""
+    return {
+        'Language_vocab': vocab_values(),
+        'Memory': memory_values(),
+        'Visual_discrimination': visual_values(),
+        'Audio_Discrimination': audio_values(),
+        'Survey_Score': survey_values(),
+    }
+
+
+def _speed_bins(forest, speed_step):
+    """Upper bin edges over [0, 1], and the forest interval each bin falls in.
+
+    The uniform ``speed_step`` edges are merged with the forest's own Speed
+    split points.  Bin ``k`` covers ``(edges[k-1], edges[k]]`` (bin 0 starts
+    at 0), and since a split sends ``x <= threshold`` left, no split can fall
+    inside a bin: every speed in a bin gets the same prediction.
+    """
+    n_bins = int(round(1 / speed_step))
+    internal = forest.left != np.arange(len(forest.left))
+    splits = np.unique(forest.threshold[internal & (forest.feature == SPEED)])
+    uniform = np.linspace(0.0, 1.0, n_bins + 1)[1:]
+    edges = np.union1d(uniform, splits[(splits >= 0.0) & (splits < 1.0)])
+    # Bins with the same number of splits below their upper edge share one evaluation
+    interval = np.searchsorted(splits, edges, side='left')
+    return edges, interval
+
+
+def build_table(forest, speed_step=0.05, batch_size=200_000, progress=None):
+    """Evaluate ``forest`` (taking raw scores) on every grid cell.
+
+    Each speed bin is evaluated at its upper edge, and bins that lie in the
+    same interval between Speed splits share one evaluation.
+    Returns (table, axes, edges).
+    """
+    axes = grid_axes()
+    edges, interval = _speed_bins(forest, speed_step)
+    discrete = [c for c in columns if c != 'Speed']
+    shape = [len(axes[c]) for c in discrete]
+
+    # Every combination of the discrete values, in table order
+    mesh = np.meshgrid(*[np.array(axes[c]) for c in discrete], indexing='ij')
+    base = np.stack([m.ravel() for m in mesh], axis=1)
+    X = np.empty((len(base), len(columns)))
+    for i, c in enumerate(discrete):
+        X[:, columns.index(c)] = base[:, i]
+
+    table = np.empty((len(edges),) + tuple(shape), dtype=np.uint8)
+    class_index = {cls: i for i, cls in enumerate(forest.classes.tolist())}
+    lookup = np.vectorize(class_index.__getitem__, otypes=[np.uint8])
+    for group in np.unique(interval):
+        bins = np.flatnonzero(interval == group)
+        X[:, SPEED] = edges[bins[0]]
+        # Only labels are stored, so rows stop as soon as their vote is decided
+        labels = np.concatenate([forest.predict_early_exit(X[s:s + batch_size])[0]
+                                 for s in range(0, len(X), batch_size)])
+        table[bins] = lookup(labels).reshape(shape)
+        if progress:
+            progress(group, len(bins))
+    # Store with the axes in column order (Speed first is only convenient while building)
+    order = [discrete.index(c) + 1 if c != 'Speed' else 0 for c in columns]
+    return np.ascontiguousarray(table.transpose(order)), axes, edges
+
+
+def save_table(path, table, axes, edges, classes, model_version):
+    np.save(f'{path}.npy', table)
+    meta = {
+        'columns': columns,
+        'axes': axes,
+        'speed_edges': edges.tolist(),
+        'classes': [int(c) for c in classes],
+        'model_version': model_version,
+    }
+    with open(f'{path}.json', 'w') as f:
+        json.dump(meta, f)
+
+
+class PredictionTable:
+    """Memory-mapped grid lookup with fallback to the full model."""
+
+    def __init__(self, path, fallback=None):
+        with open(f'{path}.json') as f:
+            meta = json.load(f)
+        self.table = np.load(f'{path}.npy', mmap_mode='r')
+        self.classes = meta['classes']
+        self.model_version = meta['model_version']
+        self.speed_edges = meta['speed_edges']
+        # Exact float value -> axis index for each discrete feature
+        self.index = [None if c == 'Speed' else {v: i for i, v in enumerate(meta['axes'][c])}
+                      for c in meta['columns']]
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, row):
+        """Class label for ``row`` from the table, or None if it is off the grid."""
+        key = []
+        for value, index in zip(row, self.index):
+            if index is None:
+                if not 0.0 <= value <= 1.0:
+                    return None
+                key.append(bisect.bisect_left(self.speed_edges, value))
+            else:
+                i = index.get(value)
+                if i is None:
+                    return None
+                key.append(i)
+        return self.classes[int(self.table[tuple(key)])]
+
+    def predict_one(self, row):
+        label = self.lookup(row)
+        if label is not None:
+            self.hits += 1
+            return label
+        self.misses += 1
+        return int(self.fallback.predict(np.asarray([row], dtype=np.float64))[0])
+
+
+def load_for(bundle, path='prediction_table', fallback=None):
+    """The table at ``path`` if it exists and was built from ``bundle``'s model, else None."""
+    if not os.path.exists(f'{path}.json'):
+        return None
+    table = PredictionTable(path, fallback)
+    return table if table.model_version == bundle.version else None
+
+
+def main(argv=None):
+    from artifacts import MODEL_PATH, SCALER_PATH, ArtifactCache
+    from forest_engine import raw_forest
+
+    parser = argparse.ArgumentParser(description="Precompute model outputs over the discrete score grid.")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--speed-step', type=float, default=0.05, help="Width of the Speed bins")
+    parser.add_argument('--output', default='prediction_table', help="Output path without extension")
+    args = parser.parse_args(argv)
+
+    bundle = ArtifactCache(args.model, args.scaler).current()
+    forest = raw_forest(bundle)
+    start = time.perf_counter()
+    table, axes, edges = build_table(
+        forest, args.speed_step,
+        progress=lambda group, n: print(f"  speed interval {group}: {n} bins"))
+    save_table(args.output, table, axes, edges, forest.classes, bundle.version)
+    print(f"Wrote {args.output}.npy {table.shape} ({table.nbytes / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Static server for the test audio clips, under content-hashed URLs.
+
+The clip set is fixed, so every variant in the audio manifest is read into
+memory once at start-up and served under its content-hashed name (see
+``audio_assets.hashed_name``):
+
+    GET /media/Bat_Pat.3f9c01d2a4b6.mp3
+
+A new recording gets a new name, so responses can be cached for good:
+``Cache-Control: public, max-age=31536000, immutable``, a strong ``ETag``
+from the content hash (``If-None-Match`` gets ``304``), and single byte
+ranges (``Range: bytes=0-1023`` gets ``206``), which browsers use to seek and
+resume audio.  ``HEAD`` is supported; unknown or outdated names get ``404``.
+
+Point the app at the server (or at a CDN in front of it) with
+``DYSLEXIA_MEDIA_URL``, e.g. ``DYSLEXIA_MEDIA_URL=http://127.0.0.1:8601/media``.
+The app then hands the browser that URL instead of registering the file with
+Streamlit's in-memory media store on every play.  ``export`` writes the
+hashed files to a directory for uploading to a CDN or object store.
+
+Usage:
+    python media_server.py serve --port 8601
+    python media_server.py export media_dist/
+"""
+import argparse
+import asyncio
+import os
+import re
+import shutil
+from urllib.parse import urlsplit
+
+import audio_assets
+
+PREFIX = '/media/'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_reasons = {200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 416: 'Range Not Satisfiable'}
+_range_pattern = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class Asset:
+    __slots__ = ('data', 'content_type', 'etag')
+
+    def __init__(self, data, content_type, sha256):
+        self.data = data
+        self.content_type = content_type
+        self.etag = f'"{sha256}"'
+
+
+def load_assets(root=audio_assets.AUDIO_ROOT):
+    """Every clip variant by content-hashed name, read into memory."""
+    assets = {}
+    for name, (path, content_type, sha256) in audio_assets.static_assets(root).items():
+        with open(path, 'rb') as f:
+            assets[name] = Asset(f.read(), content_type, sha256)
+    return assets
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, None to send everything, or ValueError."""
+    match = _range_pattern.match(header.strip())
+    if match is None:
+        # Multiple or non-byte ranges: ignored, as RFC 9110 allows
+        return None
+    first, last = match.groups()
+    if first == '':
+        if last == '' or int(last) == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def respond(asset, method, headers):
+    """(status, response headers, body) for a GET or HEAD of ``asset``."""
+    base = {'Cache-Control': CACHE_CONTROL, 'ETag': asset.etag, 'Accept-Ranges': 'bytes',
+            'Access-Control-Allow-Origin': '*'}
+    if_none_match = headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*'
+                          or asset.etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]):
+        return 304, base, b''
+
+    size = len(asset.data)
+    status, body = 200, asset.data
+    range_header = headers.get('range')
+    # If-Range with another validator means the client's copy is stale: send the whole file
+    if range_header and headers.get('if-range', asset.etag) == asset.etag:
+        try:
+            span = parse_range(range_header, size)
+        except ValueError:
+            return 416, dict(base, **{'Content-Range': f'bytes */{size}'}), b''
+        if span is not None:
+            start, end = span
+            status, body = 206, asset.data[start:end + 1]
+            base['Content-Range'] = f'bytes {start}-{end}/{size}'
+    base.update({'Content-Type': asset.content_type, 'Content-Length': str(len(body))})
+    return status, base, b'' if method == 'HEAD' else body
+
+
+async def _write(writer, status, headers, body, keep_alive):
+    head = [f"HTTP/1.1 {status} {_reasons[status]}"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, version = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return method, urlsplit(target).path, headers, keep_alive
+
+
+def make_handler(assets):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ValueError:
+                    break
+                if request is None:
+                    break
+                method, path, headers, keep_alive = request
+                length = headers.get('content-length', '0')
+                if not (length.isdigit() and int(length) == 0) or 'transfer-encoding' in headers:
+                    # Requests with a body are never valid here; don't try to skip over it.
+                    # Some clients and proxies send Content-Length: 0 on a GET, which is fine
+                    await _write(writer, 400, {'Content-Length': '0'}, b'', False)
+                    break
+                asset = assets.get(path[len(PREFIX):]) if path.startswith(PREFIX) else None
+                if method not in ('GET', 'HEAD'):
+                    await _write(writer, 405, {'Allow': 'GET, HEAD', 'Content-Length': '0'}, b'', keep_alive)
+                elif asset is None:
+                    await _write(writer, 404, {'Content-Length': '0'}, b'', keep_alive)
+                else:
+                    await _write(writer, *respond(asset, method, headers), keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(host='127.0.0.1', port=8601, root=audio_assets.AUDIO_ROOT):
+    assets = load_assets(root)
+    server = await asyncio.start_server(make_handler(assets), host, port)
+    total = sum(len(a.data) for a in assets.values())
+    print(f"Serving {len(assets)} clips ({total / 1e6:.1f} MB) on http://{host}:{port}{PREFIX}")
+    async with server:
+        await server.serve_forever()
+
+
+def export(output, root=audio_assets.AUDIO_ROOT):
+    """Copy every variant to ``output`` under its content-hashed name; returns the names."""
+    os.makedirs(output, exist_ok=True)
+    assets = audio_assets.static_assets(root)
+    for name, (path, _, _) in assets.items():
+        shutil.copyfile(path, os.path.join(output, name))
+    return sorted(assets)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the test audio as immutable static assets.")
+    parser.add_argument('--root', default=audio_assets.AUDIO_ROOT)
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve_parser = sub.add_parser('serve', help="Run the media server")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8601)
+    export_parser = sub.add_parser('export', help="Write the content-hashed files to a directory")
+    export_parser.add_argument('output')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.host, args.port, args.root))
+        except KeyboardInterrupt:
+            pass
+    else:
+        names = export(args.output, args.root)
+        print(f"Wrote {len(names)} files to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Process-wide counters, gauges and histograms in the Prometheus text format.
+
+The app, the inference path and the HTTP service record into the metrics
+defined at the bottom of this module.  Recording is a lock plus a dictionary
+update (and a ``bisect`` for histograms), so it can stay on the hot path.
+
+The metrics are exposed when ``expose()`` is called (the app does this once
+per server process), as either or both of:
+
+* ``DYSLEXIA_METRICS_PORT``: an HTTP endpoint, ``GET /metrics`` on that port,
+  for Prometheus to scrape;
+* ``DYSLEXIA_METRICS_FILE``: a file rewritten every
+  ``DYSLEXIA_METRICS_INTERVAL`` seconds (default 15), e.g. for the
+  node_exporter textfile collector.
+
+    DYSLEXIA_METRICS_PORT=9464 streamlit run app.py
+    curl localhost:9464/metrics
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, 0.5 ms to 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_text(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value, *extra in self._samples():
+            lines.append(f'{name}{_label_text(self.labels, key, *extra)} {_number(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key, cumulative, f'le="{_number(bound)}"'))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, n))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Exposition ------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def write_file(path):
+    """Write the current metrics to ``path`` atomically."""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def start_file_writer(path, interval=15.0):
+    def loop():
+        while True:
+            try:
+                write_file(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+    threading.Thread(target=loop, name='metrics-file', daemon=True).start()
+
+
+_exposed = False
+_expose_lock = threading.Lock()
+
+
+def expose():
+    """Start the exporters configured in the environment, once per process."""
+    global _exposed
+    with _expose_lock:
+        if _exposed:
+            return
+        _exposed = True
+        port = os.environ.get('DYSLEXIA_METRICS_PORT')
+        if port:
+            try:
+                start_http_server(int(port))
+            except OSError:
+                # Another process (e.g. a second app server) already serves this port
+                pass
+        path = os.environ.get('DYSLEXIA_METRICS_FILE')
+        if path:
+            start_file_writer(path, float(os.environ.get('DYSLEXIA_METRICS_INTERVAL', 15)))
+
+
+# Metrics recorded by the app and services --------------------------------------
+
+RERUN_SECONDS = Histogram('dyslexia_rerun_seconds',
+                          "Wall time of app script runs: 'script' for full reruns, else the section fragment",
+                          ['section'])
+SUBMITS = Counter('dyslexia_submits_total', "Submit button clicks by test section", ['section'])
+SESSIONS = Counter('dyslexia_sessions_total', "Test sessions started, by whether they were restored from the event log",
+                   ['restored'])
+INFERENCE_SECONDS = Histogram('dyslexia_inference_seconds',
+                              "Prediction latency: 'table' lookups (with their forest fallback), 'forest' "
+                              "single rows and 'batch' service batches", ['path'],
+                              buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                                       0.005, 0.01, 0.025, 0.05, 0.1))
+INFERENCE_ROWS = Counter('dyslexia_inference_rows_total', "Rows scored by the model", ['path'])
+MODEL_INFO = Gauge('dyslexia_model_info', "The model version being served (always 1)", ['version', 'path'])
+MODEL_LOAD_SECONDS = Gauge('dyslexia_model_load_seconds', "Time to load and compile the current model")
+MODEL_WARM_UP_SECONDS = Gauge('dyslexia_model_warm_up_seconds', "Time to warm up the current model")
+MODEL_LOADS = Counter('dyslexia_model_loads_total', "Model versions loaded by this process")
+LOGGED_SESSIONS = Gauge('dyslexia_event_log_sessions', "Sessions held in the event log (idle ones are dropped "
+                        "at snapshots)")
@@ -0,0 +1,221 @@
+"""On-demand sampling profiler for app reruns, with flamegraph-ready output.
+
+A profiled rerun has a background thread sample the script thread's stack
+every ``DYSLEXIA_PROFILE_INTERVAL_MS`` (default 2 ms), using
+``sys._current_frames``.  When the rerun ends, the samples are written in the
+collapsed-stack format (``frame;frame;frame count`` per line) that
+``flamegraph.pl``, speedscope and inferno read:
+
+    profiles/20261018-153012.481-3f2a9c01-audio_discrimination_test.folded
+
+Each stack starts at the app script, under a root frame naming the rerun
+(``rerun:script`` for full runs, ``rerun:<section>`` for a section's
+fragment), so time is attributed to the sections and, below them, to
+functions such as ``predict_label``.  ``profiles/index.jsonl`` gets one line
+per profile with its wall time and sample count, to find the slow ones.
+
+Which reruns are profiled:
+
+* ``DYSLEXIA_PROFILE_FRACTION``: a random fraction of all reruns (e.g. 0.01);
+* ``?profile=<token>`` in the page URL, when it matches
+  ``DYSLEXIA_PROFILE_TOKEN``: every rerun of that session.
+
+Nothing runs for reruns that are not profiled.
+
+Usage:
+    python profiling.py top profiles/ --limit 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_DIR = os.environ.get('DYSLEXIA_PROFILE_DIR', 'profiles')
+SAMPLE_FRACTION = float(os.environ.get('DYSLEXIA_PROFILE_FRACTION', 0))
+PROFILE_TOKEN = os.environ.get('DYSLEXIA_PROFILE_TOKEN')
+INTERVAL = float(os.environ.get('DYSLEXIA_PROFILE_INTERVAL_MS', 2)) / 1000
+MAX_SECONDS = 120  # A rerun that never reports back (e.g. it raised) stops being sampled after this
+
+_active = {}  # thread id -> Sampler of the run in progress on that thread
+_active_lock = threading.Lock()
+_index_lock = threading.Lock()
+
+
+def requested(query_token=None):
+    """Whether to profile this rerun: sampled at SAMPLE_FRACTION, or asked for with the admin token."""
+    if PROFILE_TOKEN and query_token == PROFILE_TOKEN:
+        return True
+    return SAMPLE_FRACTION > 0 and random.random() < SAMPLE_FRACTION
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Samples one thread's stack until ``stop()`` or the run ends, then writes the profile.
+
+    Stacks start at the first frame in ``root_file`` (the app script).  The
+    run is the call of ``frame`` (default: none, sample until stopped): once
+    it is off the thread's stack the run is over, even when the thread goes
+    on to another one, as it does after ``st.rerun``.
+    """
+
+    def __init__(self, name, root_file, session=None, directory=PROFILE_DIR, interval=INTERVAL, frame=None):
+        self.name = name
+        self.root_file = root_file
+        self.session = session
+        self.directory = directory
+        self.thread_id = threading.get_ident()
+        self.frame = frame
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = time.time()
+        self._started = time.perf_counter()
+        self.wall_seconds = None
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        deadline = time.perf_counter() + MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                # The script thread is gone: the run ended without reaching ``finish``
+                break
+            codes, in_run = [], self.frame is None
+            while frame is not None:
+                codes.append(frame.f_code)
+                in_run = in_run or frame is self.frame
+                frame = frame.f_back
+            if not in_run:
+                # The run ended without reaching ``finish`` (and the thread may be in the next one)
+                break
+            # Outermost first, starting at the app script
+            codes.reverse()
+            for i, code in enumerate(codes):
+                if code.co_filename == self.root_file:
+                    codes = codes[i:]
+                    break
+            self.stacks[tuple(codes)] += 1
+        self.wall_seconds = time.perf_counter() - self._started
+        self.frame = None
+        with _active_lock:
+            if _active.get(self.thread_id) is self:
+                del _active[self.thread_id]
+        self.path = self.write()
+
+    def running_in(self, frame):
+        """Whether the stack ending at ``frame`` is inside this sampler's run."""
+        while frame is not None:
+            if frame is self.frame:
+                return True
+            frame = frame.f_back
+        return False
+
+    def stop(self):
+        """Stop sampling and wait for the profile to be written; returns its path."""
+        self._stop.set()
+        self._thread.join()
+        return self.path
+
+    def collapsed(self):
+        """The samples as collapsed-stack lines, heaviest first."""
+        root = f'rerun:{self.name}'
+        return [';'.join([root] + [_label(code) for code in stack]) + f' {count}'
+                for stack, count in self.stacks.most_common()]
+
+    def write(self):
+        """Write the ``.folded`` file and its index entry; returns the file path."""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started)) + f'.{int(self.started * 1000) % 1000:03d}'
+        parts = [stamp] + ([self.session[:8]] if self.session else []) + [self.name]
+        path = os.path.join(self.directory, '-'.join(parts) + '.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        entry = {'file': os.path.basename(path), 'rerun': self.name, 'session': self.session,
+                 'started': self.started, 'wall_seconds': round(self.wall_seconds, 6),
+                 'samples': sum(self.stacks.values()), 'interval': self.interval}
+        with _index_lock, open(os.path.join(self.directory, 'index.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        return path
+
+
+def start(name, root_file, enabled, session=None):
+    """Start sampling the calling thread if ``enabled``; returns the sampler to pass to ``finish``, or None.
+
+    The run being profiled is the caller's: nothing is started while it is
+    inside a run that is already sampled (a section run inside a profiled
+    full run is covered by that run's profile).  A sampler left over from an
+    earlier run on this thread that never reached ``finish`` is stopped, so
+    each run gets a profile of its own.
+    """
+    if not enabled:
+        return None
+    thread_id = threading.get_ident()
+    frame = sys._getframe(1)
+    with _active_lock:
+        previous = _active.get(thread_id)
+        if previous is not None and previous.running_in(frame):
+            return None
+        sampler = _active[thread_id] = Sampler(name, root_file, session, frame=frame)
+    if previous is not None:
+        previous.stop()
+    return sampler.start()
+
+
+def finish(sampler):
+    """Stop ``sampler`` (if any); returns the path of the written profile.
+
+    A run that stops early (``st.rerun``, ``st.stop``, an exception) skips
+    this call; its sampler writes the profile once the run is off the
+    thread's stack, or when the next run on the thread starts a sampler.
+    """
+    if sampler is None:
+        return None
+    return sampler.stop()
+
+
+def top(directory=PROFILE_DIR, limit=20):
+    """Functions by total (inclusive) samples over every profile in ``directory``."""
+    inclusive, total = Counter(), 0
+    for name in os.listdir(directory):
+        if not name.endswith('.folded'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if not stack:
+                    continue
+                count = int(count)
+                total += count
+                for frame in set(stack.split(';')):
+                    inclusive[frame] += count
+    return total, inclusive.most_common(limit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise the collapsed-stack profiles of app reruns.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    top_parser = sub.add_parser('top', help="Functions with the most inclusive samples")
+    top_parser.add_argument('directory', nargs='?', default=PROFILE_DIR)
+    top_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    total, rows = top(args.directory, args.limit)
+    print(f"{total} samples")
+    for frame, count in rows:
+        print(f"{100 * count / max(total, 1):6.1f}%  {count:>7}  {frame}")
+
+
+if __name__ == '__main__':
+    main()
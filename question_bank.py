@@ -0,0 +1,300 @@
+"""Compiled, indexed question banks.
+
+A question bank JSON file (``{"questions": [...]}``, as in
+``questions_vocab.json``) is compiled into a directory:
+
+    meta.json            question count, source hash, size and mtime, index table and data file names
+    records-<id>.jsonl   one question per line, in source order
+    offsets-<id>.npy     byte offset of each line in records.jsonl (uint64, n + 1)
+    postings-<id>.npy    question ids grouped by index key (int32)
+
+Each build writes its data files under a new ``<id>`` and then replaces
+``meta.json`` in one rename, so a process that has the previous build
+memory-mapped keeps reading intact files while new opens see the new one.
+The previous build's files are deleted where the OS allows it (on Windows,
+not while they are mapped; a later build deletes them).
+
+Questions are indexed by ``type``, ``difficulty`` (``'unrated'`` when
+missing), each entry of ``tags``, and by type and difficulty together.  Each
+index key maps to a ``[start, end)`` slice of ``postings.npy``, so finding
+the questions of a kind is a dictionary lookup, and sampling ``k`` of them
+draws ``k`` positions from that slice and parses only those ``k`` records.
+The arrays and the records file are memory-mapped, so opening a bank of any
+size reads only ``meta.json``.
+
+    bank = open_bank('questions_vocab.json')
+    bank.sample(10, type='sentence_completion')
+    bank.sample_strata({'easy': 4, 'medium': 4, 'hard': 2}, type='sentence_completion')
+
+Usage:
+    python question_bank.py build questions_vocab.json
+    python question_bank.py sample questions_vocab.bank --type sentence_completion --strata easy=4,medium=4,hard=2
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import random
+import threading
+import uuid
+
+import numpy as np
+
+FORMAT_VERSION = 1
+UNRATED = 'unrated'
+REQUIRED_FIELDS = ('type', 'question', 'options', 'correct_answer')
+
+# Filters that can be combined in one lookup, and the index holding them
+_indexes = {
+    ('type',): 'type',
+    ('difficulty',): 'difficulty',
+    ('tag',): 'tag',
+    ('difficulty', 'type'): 'type+difficulty',
+}
+
+
+def _index_key(index, filters):
+    if index == 'type+difficulty':
+        return f"{filters['type']}|{filters['difficulty']}"
+    return filters[index]
+
+
+def validate(questions):
+    """List of problems found in ``questions`` (empty if there are none)."""
+    problems = []
+    for i, q in enumerate(questions):
+        missing = [field for field in REQUIRED_FIELDS if field not in q]
+        if missing:
+            problems.append(f"question {i}: missing {', '.join(missing)}")
+        elif q['correct_answer'] not in q['options']:
+            problems.append(f"question {i}: correct_answer {q['correct_answer']!r} is not one of the options")
+    return problems
+
+
+def compile_questions(questions):
+    """Build the index table, offsets, postings and records for ``questions``."""
+    groups = {index: {} for index in _indexes.values()}
+    lines = []
+    for i, q in enumerate(questions):
+        difficulty = q.get('difficulty', UNRATED)
+        groups['type'].setdefault(q['type'], []).append(i)
+        groups['difficulty'].setdefault(difficulty, []).append(i)
+        groups['type+difficulty'].setdefault(f"{q['type']}|{difficulty}", []).append(i)
+        for tag in q.get('tags', []):
+            groups['tag'].setdefault(tag, []).append(i)
+        lines.append(json.dumps(q, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    table, postings, start = {}, [], 0
+    for index, keys in groups.items():
+        table[index] = {}
+        for key in sorted(keys):
+            ids = keys[key]
+            table[index][key] = [start, start + len(ids)]
+            postings.extend(ids)
+            start += len(ids)
+
+    offsets = np.zeros(len(lines) + 1, dtype=np.uint64)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+    return table, offsets, np.asarray(postings, dtype=np.int32), b''.join(lines)
+
+
+def build(source, output=None):
+    """Compile the JSON bank at ``source`` into the directory ``output``."""
+    output = output or os.path.splitext(source)[0] + '.bank'
+    with open(source, 'rb') as f:
+        raw = f.read()
+        source_stat = os.fstat(f.fileno())
+    questions = json.loads(raw)['questions']
+    problems = validate(questions)
+    if problems:
+        raise ValueError(f"{source}: " + '; '.join(problems))
+    table, offsets, postings, records = compile_questions(questions)
+
+    os.makedirs(output, exist_ok=True)
+    # Never overwrite files another process may have memory-mapped: this build gets new names
+    build_id = uuid.uuid4().hex[:12]
+    files = {'records': f'records-{build_id}.jsonl', 'offsets': f'offsets-{build_id}.npy',
+             'postings': f'postings-{build_id}.npy'}
+    with open(os.path.join(output, files['records']), 'wb') as f:
+        f.write(records)
+    np.save(os.path.join(output, files['offsets']), offsets)
+    np.save(os.path.join(output, files['postings']), postings)
+    # Swapped in last, in one rename: readers see the old build or the new one, never a mix
+    meta = {'version': FORMAT_VERSION, 'count': len(questions),
+            'source_sha256': hashlib.sha256(raw).hexdigest(), 'source_size': source_stat.st_size,
+            'source_mtime_ns': source_stat.st_mtime_ns, 'index': table, 'files': files}
+    meta_path = os.path.join(output, 'meta.json')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    # Also clears files an earlier build could not delete.  On POSIX, unlinking keeps the old
+    # files readable for processes that still have them mapped; Windows refuses while they are
+    for name in os.listdir(output):
+        if name.startswith(('records', 'offsets', 'postings')) and name not in files.values():
+            try:
+                os.remove(os.path.join(output, name))
+            except OSError:
+                pass
+    return output
+
+
+class QuestionBank:
+    """Read-only question bank with constant-time filtered and stratified sampling."""
+
+    def __init__(self, meta, offsets, postings, records):
+        self.meta = meta
+        self.index = meta['index']
+        self.offsets = offsets
+        self.postings = postings
+        self.records = records
+
+    @classmethod
+    def load(cls, path, attempts=3):
+        for attempt in range(attempts):
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported question bank version {meta.get('version')}")
+            # Banks built before data files were versioned use fixed names
+            files = meta.get('files', {'records': 'records.jsonl', 'offsets': 'offsets.npy',
+                                       'postings': 'postings.npy'})
+            try:
+                with open(os.path.join(path, files['records']), 'rb') as f:
+                    records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if meta['count'] else b''
+                return cls(meta,
+                           np.load(os.path.join(path, files['offsets']), mmap_mode='r'),
+                           np.load(os.path.join(path, files['postings']), mmap_mode='r'),
+                           records)
+            except FileNotFoundError:
+                # A rebuild replaced meta.json and removed these files after we read it
+                if attempt == attempts - 1:
+                    raise
+
+    @classmethod
+    def from_json(cls, source):
+        """Index a JSON bank in memory (used when no compiled bank is available)."""
+        with open(source, 'rb') as f:
+            raw = f.read()
+        questions = json.loads(raw)['questions']
+        table, offsets, postings, records = compile_questions(questions)
+        meta = {'version': FORMAT_VERSION, 'count': len(questions),
+                'source_sha256': hashlib.sha256(raw).hexdigest(), 'index': table}
+        return cls(meta, offsets, postings, records)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def __getitem__(self, i):
+        return json.loads(self.records[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def keys(self, index):
+        """The values present in ``index`` ('type', 'difficulty', 'tag' or 'type+difficulty')."""
+        return list(self.index[index])
+
+    def _slice(self, filters):
+        filters = {name: value for name, value in filters.items() if value is not None}
+        if not filters:
+            return 0, len(self), None
+        index = _indexes.get(tuple(sorted(filters)))
+        if index is None:
+            raise ValueError(f"no index for filtering by {', '.join(sorted(filters))}")
+        start, end = self.index[index].get(_index_key(index, filters), (0, 0))
+        return start, end, self.postings
+
+    def ids(self, type=None, difficulty=None, tag=None):
+        """Ids of the matching questions, in source order."""
+        start, end, postings = self._slice({'type': type, 'difficulty': difficulty, 'tag': tag})
+        return np.arange(start, end) if postings is None else postings[start:end]
+
+    def count(self, type=None, difficulty=None, tag=None):
+        start, end, _ = self._slice({'type': type, 'difficulty': difficulty, 'tag': tag})
+        return end - start
+
+    def sample(self, k, rng=random, type=None, difficulty=None, tag=None):
+        """``k`` distinct matching questions, like ``random.sample`` over the filtered list."""
+        start, end, postings = self._slice({'type': type, 'difficulty': difficulty, 'tag': tag})
+        positions = rng.sample(range(start, end), k)
+        return [self[i if postings is None else int(postings[i])] for i in positions]
+
+    def sample_strata(self, strata, rng=random, type=None):
+        """Questions drawn per difficulty, e.g. ``{'easy': 4, 'medium': 4, 'hard': 2}``, in that order."""
+        selected = []
+        for difficulty, k in strata.items():
+            selected.extend(self.sample(k, rng, type=type, difficulty=difficulty))
+        return selected
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+def open_bank(source, compiled=None):
+    """The bank for the JSON file ``source``, opened once per process.
+
+    Uses the compiled bank (default: ``source`` with a ``.bank`` extension)
+    when it was built from the current ``source``, and otherwise indexes
+    ``source`` in memory.  ``source`` is only hashed when its size or mtime
+    differ from the build's.
+    """
+    compiled = compiled or os.path.splitext(source)[0] + '.bank'
+    key = (source, compiled)
+    if key not in _banks:
+        with _banks_lock:
+            if key not in _banks:
+                bank = None
+                if os.path.exists(os.path.join(compiled, 'meta.json')):
+                    bank = QuestionBank.load(compiled)
+                    stat = os.stat(source)
+                    built_from = (bank.meta.get('source_size'), bank.meta.get('source_mtime_ns'))
+                    if built_from != (stat.st_size, stat.st_mtime_ns):
+                        with open(source, 'rb') as f:
+                            if bank.meta['source_sha256'] != hashlib.sha256(f.read()).hexdigest():
+                                bank = None
+                _banks[key] = bank or QuestionBank.from_json(source)
+    return _banks[key]
+
+
+def _parse_strata(text):
+    strata = {}
+    for part in text.split(','):
+        name, k = part.split('=')
+        strata[name.strip()] = int(k)
+    return strata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and query indexed question banks.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help="Compile a JSON question bank")
+    build_parser.add_argument('source')
+    build_parser.add_argument('--output', help="Output directory (default: SOURCE with a .bank extension)")
+    sample_parser = sub.add_parser('sample', help="Draw questions from a compiled bank")
+    sample_parser.add_argument('bank')
+    sample_parser.add_argument('-k', type=int, default=10)
+    sample_parser.add_argument('--type')
+    sample_parser.add_argument('--difficulty')
+    sample_parser.add_argument('--tag')
+    sample_parser.add_argument('--strata', help="Per-difficulty counts, e.g. easy=4,medium=4,hard=2")
+    sample_parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        output = build(args.source, args.output)
+        bank = QuestionBank.load(output)
+        print(f"Wrote {output}: {len(bank)} questions")
+        for index in ('type', 'difficulty'):
+            print(f"  {index}: " + ', '.join(f"{key} {bank.count(**{index: key})}" for key in bank.keys(index)))
+    elif args.command == 'sample':
+        bank = QuestionBank.load(args.bank)
+        rng = random.Random(args.seed)
+        if args.strata:
+            questions = bank.sample_strata(_parse_strata(args.strata), rng, type=args.type)
+        else:
+            questions = bank.sample(args.k, rng, type=args.type, difficulty=args.difficulty, tag=args.tag)
+        for q in questions:
+            print(f"[{q.get('difficulty', UNRATED)}] {q['question']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""Scoring rules for every test section, independent of the Streamlit UI.
+
+The single-answer functions are what ``app.py`` calls when a section is
+submitted.  ``score_batch`` applies the same rules with NumPy operations to
+a columnar batch of answer sheets, so archived sessions can be re-scored in
+bulk after a rule change without replaying the UI.  Both paths use the same
+arithmetic (including the order floating-point partial scores are added in),
+so they produce bit-identical scores.
+
+Free-text answers (recalled word lists and the repeated sentence) earn
+partial credit for the words they get right, their order and their spelling,
+using the word alignment in ``fuzzy_match``.
+"""
+import numpy as np
+
+import fuzzy_match
+
+# The exact feature names used during training
+columns = ['Language_vocab', 'Memory', 'Speed', 'Visual_discrimination', 'Audio_Discrimination', 'Survey_Score']
+
+# Placeholder shown by unanswered radio buttons
+NO_ANSWER = 'Select an answer'
+
+# Time limits in minutes
+MAX_TIME = 30  # Total time for the test
+MIN_TIME = 3   # Time at which speed score is at maximum (1)
+
+# Memory Part 2: the word list read out in each recording (audio_1 ... audio_10)
+RECALL_LISTS = [
+    ["Apple", "Lettuce", "House", "River", "Dog", "Book", "Cooking"],
+    ["Dog", "Cat", "Rabbit", "Horse", "Sheep", "Cow", "Goat"],
+    ["Table", "Chair", "Sofa", "Bed", "Desk", "Lamp", "Shelf"],
+    ["River", "Lake", "Ocean", "Pond", "Stream", "Beach", "Waterfall"],
+    ["Red", "Blue", "Green", "Yellow", "Pink", "Black", "White"],
+    ["Car", "Bus", "Train", "Plane", "Boat", "Bike", "Truck"],
+    ["Rain", "Snow", "Sun", "Cloud", "Wind", "Storm", "Thunder"],
+    ["Pen", "Pencil", "Eraser", "Paper", "Book", "Notebook", "Ruler"],
+    ["Tree", "Flower", "Grass", "Leaf", "Seed", "Branch", "Bush"],
+    ["Shirt", "Pants", "Socks", "Jacket", "Hat", "Gloves", "Scarf"]
+]
+
+# Visual discrimination
+CORRECT_COUNT_D = 3  # Number of 'd' letters in the letter identification line
+CORRECT_DIFFERENCES = ["b", "p", "q", "d"]
+ODD_ONE_OUT_OPTIONS = ['Select an answer', "a) ○", "b) ○", "c) ○", "d) ■"]
+ODD_ONE_OUT_CORRECT = "d) ■"
+
+# Audio discrimination: (label, clip name, correct answer)
+PHONEME_QUESTIONS = [
+    ("Audio 1", "Bat_Pat", "Different"),
+    ("Audio 2", "Ship_Sheep", "Different"),
+    ("Audio 3", "Cat_Cat", "Same"),
+    ("Audio 4", "Light_Right", "Different"),
+    ("Audio 5", "Thin_Tin", "Different"),
+]
+RHYMING_OPTIONS = ["Take", "Back", "Lake", "Bike"]
+RHYMING_CORRECT = ["Take", "Lake"]
+STRESS_CORRECT = None  # The stress pattern item has no answer key yet, so it always scores 0
+SENTENCE_CORRECT = "The quick brown fox jumps over the lazy dog."
+
+# Survey
+SURVEY_QUESTIONS = [
+    "Do you often find it difficult to read words or letters in the correct order?",
+    "Do you have trouble spelling common words correctly?",
+    "Do you frequently mix up similar-looking letters like 'b' and 'd'?",
+    "Do you find it hard to concentrate when reading or writing?",
+    "Do you have difficulty remembering sequences such as phone numbers?"
+]
+SURVEY_OPTIONS = ["Select an answer", "Yes", "Often", "Sometimes", "Not Often", "No"]
+SURVEY_SCORES = {"Yes": 4, "Often": 3, "Sometimes": 2, "Not Often": 1, "No": 0}
+SURVEY_MAX = 20  # 5 questions * 4 points max per question
+
+
+# ---------------------------------------------------------------------------
+# Single session
+# ---------------------------------------------------------------------------
+
+def vocabulary_score(user_answers, correct_answers):
+    """Fraction of questions answered correctly (case-insensitive); unanswered count as wrong."""
+    score_count = 0
+    for user_answer, correct in zip(user_answers, correct_answers):
+        if user_answer != NO_ANSWER and user_answer.lower() == correct.lower():
+            score_count += 1
+    return score_count / len(correct_answers)
+
+
+def sequence_correct(user_answer, sequence):
+    """1 if the typed digits (spaces ignored) match the sequence, else 0."""
+    if user_answer.strip() == '':
+        return 0
+    return int(user_answer.replace(" ", "") == ''.join(map(str, sequence)))
+
+
+def memory_sequences_score(scores):
+    return sum(scores) / 5
+
+
+def recall_credit(user_answer, correct_words):
+    """Credit in [0, 1] for a recalled list: 1 for an exact match, partial for missing, misordered or misspelt words."""
+    return fuzzy_match.credit(user_answer, correct_words)
+
+
+def recall_score(scores):
+    # Unsubmitted items (None) count as 0
+    return sum(filter(None, scores)) / len(scores)
+
+
+def letter_identification_score(count_d):
+    if count_d == 0:
+        return 0
+    return min(count_d, CORRECT_COUNT_D) * (1/3)  # Each correct 'd' is worth 0.33, max is 1
+
+
+def spot_differences_score(text):
+    """Return (score, unique differences, invalid differences, correct count)."""
+    if text.strip() == '':
+        return 0, [], [], 0
+    user_differences = [item.strip().lower() for item in text.split(",") if item.strip()]
+    unique_user_differences = list(set(user_differences))
+    invalid_differences = [diff for diff in unique_user_differences if diff not in CORRECT_DIFFERENCES]
+    correct_count = sum(1 for diff in unique_user_differences if diff in CORRECT_DIFFERENCES)
+    return min(correct_count * 0.25, 1), unique_user_differences, invalid_differences, correct_count
+
+
+def odd_one_out_score(choice):
+    return 1 if choice == ODD_ONE_OUT_CORRECT else 0
+
+
+def visual_score(letter_identification, spot_differences, odd_one_out):
+    return (letter_identification + spot_differences + odd_one_out) / 3  # Average the scores
+
+
+def phoneme_score(user_answers):
+    score = 0
+    for user_answer, (_, _, correct_answer) in zip(user_answers, PHONEME_QUESTIONS):
+        if user_answer != NO_ANSWER and user_answer == correct_answer:
+            score += 0.1  # Each correct answer is worth 0.1
+    return score
+
+
+def rhyming_score(selected):
+    if not selected:
+        return 0
+    correct_set = set(RHYMING_CORRECT)
+    return (len(correct_set & set(selected)) / len(correct_set)) * 0.1  # Proportional score
+
+
+def stress_score(user_answer):
+    if STRESS_CORRECT is not None and user_answer != NO_ANSWER and user_answer == STRESS_CORRECT:
+        return 0.1
+    return 0
+
+
+def sentence_score(user_answer):
+    # Up to 0.3, scaled by how closely the words match the sentence
+    return 0.3 * fuzzy_match.credit(user_answer, SENTENCE_CORRECT)
+
+
+def audio_discrimination_scores(phoneme_answers, rhyming_selected, stress_answer, sentence_answer):
+    """Per-task scores and their total, keyed phoneme/rhyming/stress/sentence/total."""
+    parts = {
+        'phoneme': phoneme_score(phoneme_answers),
+        'rhyming': rhyming_score(rhyming_selected),
+        'stress': stress_score(stress_answer),
+        'sentence': sentence_score(sentence_answer),
+    }
+    parts['total'] = parts['phoneme'] + parts['rhyming'] + parts['stress'] + parts['sentence']
+    return parts
+
+
+def survey_scores(responses):
+    """Return (raw score out of 20, scaled score)."""
+    raw_score = 0
+    for resp in responses:
+        if resp != NO_ANSWER:
+            raw_score += SURVEY_SCORES[resp]
+    return raw_score, raw_score / SURVEY_MAX
+
+
+def speed_score(time_taken):
+    """1 at or below MIN_TIME minutes, falling linearly to 0 at MAX_TIME."""
+    return max(0, min(1, 1 - (time_taken - MIN_TIME) / (MAX_TIME - MIN_TIME)))
+
+
+# ---------------------------------------------------------------------------
+# Batches
+# ---------------------------------------------------------------------------
+
+def _strings(values):
+    return np.asarray(values, dtype=str)
+
+
+def _running_sums(step, n):
+    # Value after adding ``step`` k times, in the same order as the per-session loop
+    sums, total = [0], 0
+    for _ in range(n):
+        total += step
+        sums.append(total)
+    return np.array(sums, dtype=np.float64)
+
+
+def batch_vocabulary(user_answers, correct_answers):
+    user_answers, correct_answers = _strings(user_answers), _strings(correct_answers)
+    correct = (user_answers != NO_ANSWER) & (np.char.lower(user_answers) == np.char.lower(correct_answers))
+    return correct.sum(axis=1) / correct_answers.shape[1]
+
+
+def batch_sequences(user_answers, sequences):
+    """``sequences`` as digit strings, e.g. '402718'; returns the per-item 0/1 matrix."""
+    user_answers, sequences = _strings(user_answers), _strings(sequences)
+    answered = np.char.strip(user_answers) != ''
+    return (answered & (np.char.replace(user_answers, ' ', '') == sequences)).astype(np.int64)
+
+
+def batch_recall(user_answers, correct_lists):
+    """``correct_lists`` holds the joined word list for each item; returns the per-item credit matrix."""
+    user_answers, correct_lists = _strings(user_answers), _strings(correct_lists)
+    credit = fuzzy_match.batch_credit(user_answers.ravel().tolist(), correct_lists.ravel().tolist())
+    return credit.reshape(user_answers.shape)
+
+
+def batch_letter_identification(counts):
+    counts = np.asarray(counts, dtype=np.int64)
+    values = np.array([letter_identification_score(c) for c in range(CORRECT_COUNT_D + 1)], dtype=np.float64)
+    return values[np.clip(counts, 0, CORRECT_COUNT_D)]
+
+
+def batch_spot_differences(texts):
+    # Free text has to be tokenised per row; the scoring itself is a table lookup
+    correct = np.fromiter((spot_differences_score(t)[3] for t in texts), dtype=np.int64)
+    values = np.array([min(k * 0.25, 1) for k in range(len(CORRECT_DIFFERENCES) + 1)], dtype=np.float64)
+    return np.where(np.char.strip(_strings(texts)) == '', 0.0, values[correct])
+
+
+def batch_odd_one_out(choices):
+    return (_strings(choices) == ODD_ONE_OUT_CORRECT).astype(np.float64)
+
+
+def batch_phoneme(user_answers):
+    user_answers = _strings(user_answers)
+    expected = np.array([correct for _, _, correct in PHONEME_QUESTIONS])
+    count = ((user_answers != NO_ANSWER) & (user_answers == expected)).sum(axis=1)
+    return _running_sums(0.1, len(PHONEME_QUESTIONS))[count]
+
+
+def batch_rhyming(selected):
+    """``selected``: boolean matrix (n, len(RHYMING_OPTIONS)) or one list of words per row."""
+    if not (isinstance(selected, np.ndarray) and selected.dtype == bool):
+        selected = np.array([[option in row for option in RHYMING_OPTIONS] for row in selected], dtype=bool)
+    is_correct = np.array([option in RHYMING_CORRECT for option in RHYMING_OPTIONS])
+    hits = (selected & is_correct).sum(axis=1)
+    return np.where(selected.any(axis=1), (hits / len(RHYMING_CORRECT)) * 0.1, 0.0)
+
+
+def batch_stress(user_answers):
+    user_answers = _strings(user_answers)
+    if STRESS_CORRECT is None:
+        return np.zeros(user_answers.shape)
+    return np.where((user_answers != NO_ANSWER) & (user_answers == STRESS_CORRECT), 0.1, 0.0)
+
+
+def batch_sentence(user_answers):
+    user_answers = _strings(user_answers).tolist()
+    return 0.3 * fuzzy_match.batch_credit(user_answers, [SENTENCE_CORRECT] * len(user_answers))
+
+
+def batch_survey(responses):
+    responses = _strings(responses)
+    points = np.zeros(responses.shape, dtype=np.int64)
+    for option, value in SURVEY_SCORES.items():
+        points[responses == option] = value
+    raw = points.sum(axis=1)
+    return raw, raw / SURVEY_MAX
+
+
+def batch_speed(time_taken):
+    time_taken = np.asarray(time_taken, dtype=np.float64)
+    return np.maximum(0, np.minimum(1, 1 - (time_taken - MIN_TIME) / (MAX_TIME - MIN_TIME)))
+
+
+def score_batch(sheets):
+    """Score a columnar batch of answer sheets.
+
+    ``sheets`` maps field names to per-session arrays (a dict of arrays or a
+    DataFrame with list-valued columns).  Any of these groups may be given;
+    the matching scores are returned as arrays:
+
+        vocab_answers, vocab_correct            (n, 10)  -> Language_vocab
+        memory_answers, memory_sequences        (n, 5)   -> Memory_sequences
+        recall_answers, recall_correct          (n, 5)   -> Memory_recall
+        letter_count, spot_differences,
+        odd_one_out                             (n,)     -> Visual_discrimination
+        phoneme_answers (n, 5), rhyming_selected,
+        stress_answer (n,), sentence_answer (n,)         -> Audio_Discrimination
+        survey_responses                        (n, 5)   -> Survey_Score
+        time_taken (minutes)                    (n,)     -> Speed
+
+    Memory sequences and recall word lists may be lists or pre-joined strings.
+    """
+    def rows(name):
+        return np.array([list(v) for v in sheets[name]]) if not isinstance(sheets[name], np.ndarray) \
+            else sheets[name]
+
+    def joined(name, sep):
+        # Sequences / word lists may be given as lists; compare them as joined strings
+        return [[item if isinstance(item, str) else sep.join(map(str, item)) for item in row]
+                for row in sheets[name]]
+
+    out = {}
+    if 'vocab_answers' in sheets:
+        out['Language_vocab'] = batch_vocabulary(rows('vocab_answers'), rows('vocab_correct'))
+    if 'memory_answers' in sheets:
+        items = batch_sequences(rows('memory_answers'), joined('memory_sequences', ''))
+        out['Memory_sequences'] = items.sum(axis=1) / 5
+    if 'recall_answers' in sheets:
+        items = batch_recall(rows('recall_answers'), joined('recall_correct', ' '))
+        out['Memory_recall'] = items.sum(axis=1) / items.shape[1]
+    if 'letter_count' in sheets:
+        out['Letter_identification'] = batch_letter_identification(sheets['letter_count'])
+        out['Spot_differences'] = batch_spot_differences(list(sheets['spot_differences']))
+        out['Odd_one_out'] = batch_odd_one_out(sheets['odd_one_out'])
+        out['Visual_discrimination'] = (out['Letter_identification'] + out['Spot_differences']
+                                        + out['Odd_one_out']) / 3
+    if 'phoneme_answers' in sheets:
+        out['Phoneme'] = batch_phoneme(rows('phoneme_answers'))
+        out['Rhyming'] = batch_rhyming(list(sheets['rhyming_selected']))
+        out['Stress'] = batch_stress(sheets['stress_answer'])
+        out['Sentence'] = batch_sentence(sheets['sentence_answer'])
+        out['Audio_Discrimination'] = out['Phoneme'] + out['Rhyming'] + out['Stress'] + out['Sentence']
+    if 'survey_responses' in sheets:
+        out['Survey_raw'], out['Survey_Score'] = batch_survey(rows('survey_responses'))
+    if 'time_taken' in sheets:
+        out['Speed'] = batch_speed(sheets['time_taken'])
+    return out
@@ -0,0 +1,231 @@
+"""Train the dyslexia Random Forest and write versioned model artifacts.
+
+Reproduces the training in ``data_preprocessing_model_training.ipynb``:
+an 80/20 split of ``labelled_dysx.csv`` (``random_state=10``), a
+``StandardScaler`` fitted on the training part, and a grid search over
+``n_estimators`` for ``RandomForestClassifier(random_state=0)`` with the
+same 5-fold stratified cross-validation ``GridSearchCV`` uses.
+
+Two things make it faster than the notebook:
+
+* The folds run in parallel, one per worker process.
+* Within a fold, the forest is grown with ``warm_start`` through the sorted
+  grid (10 -> 100 -> 500 -> 1000 trees), and each candidate is scored on the
+  way.  With an integer ``random_state`` a forest grown this way has exactly
+  the trees a fresh fit of that size would have, so the scores match
+  ``GridSearchCV`` while only the largest forest is actually built.
+
+The best candidate is then refit on the whole training part and written with
+its scaler to ``models/<timestamp>-<version>/`` together with a
+``metadata.json`` holding the cross-validation and hold-out scores.
+``--publish`` also replaces ``model.pkl``/``scaler.pkl``, which running apps
+pick up on their next artifact check.
+
+Usage:
+    python train_model.py --data labelled_dysx.csv --workers 4 --publish
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, get_scorer, mean_absolute_error
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from artifacts import COMPILED_SUFFIX, MODEL_PATH, SCALER_PATH, file_digest
+
+# The exact feature names used during training
+columns = ['Language_vocab', 'Memory', 'Speed', 'Visual_discrimination', 'Audio_Discrimination', 'Survey_Score']
+LABEL = 'Label'
+
+DEFAULT_GRID = [10, 100, 500, 1000]
+
+
+def load_data(path):
+    data = pd.read_csv(path, encoding='utf-8-sig')
+    return data[columns], data[LABEL]
+
+
+def grow_and_score(X_train, y_train, X_valid, y_valid, grid, scoring, random_state=0, n_jobs=1):
+    """Score a forest of each size in ``grid`` on one fold, growing a single forest through them.
+
+    Returns a list of (n_estimators, score, seconds spent growing to that size).
+    """
+    scorer = get_scorer(scoring)
+    forest = RandomForestClassifier(random_state=random_state, warm_start=True, n_jobs=n_jobs)
+    results = []
+    for n_estimators in sorted(grid):
+        start = time.perf_counter()
+        forest.set_params(n_estimators=n_estimators)
+        forest.fit(X_train, y_train)
+        results.append((n_estimators, scorer(forest, X_valid, y_valid), time.perf_counter() - start))
+    return results
+
+
+def _fold_task(args):
+    X, y, train_index, valid_index, grid, scoring, random_state, n_jobs = args
+    return grow_and_score(X[train_index], y[train_index], X[valid_index], y[valid_index],
+                          grid, scoring, random_state, n_jobs)
+
+
+def cross_validate(X, y, grid, scoring='f1_macro', folds=5, workers=1, random_state=0):
+    """Mean and std of the fold scores for every grid value, with folds run in parallel."""
+    X, y = np.asarray(X), np.asarray(y)
+    splits = list(StratifiedKFold(n_splits=folds).split(X, y))
+    # Workers beyond one per fold build trees in threads inside the fold
+    n_jobs = max(1, workers // folds)
+    tasks = [(X, y, train_index, valid_index, grid, scoring, random_state, n_jobs)
+             for train_index, valid_index in splits]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, folds)) as pool:
+            fold_results = list(pool.map(_fold_task, tasks))
+    else:
+        fold_results = [_fold_task(task) for task in tasks]
+
+    summary = {}
+    for i, n_estimators in enumerate(sorted(grid)):
+        scores = [fold[i][1] for fold in fold_results]
+        summary[n_estimators] = {'mean_score': float(np.mean(scores)), 'std_score': float(np.std(scores)),
+                                 'fold_scores': [float(s) for s in scores],
+                                 'fit_seconds': float(sum(fold[i][2] for fold in fold_results))}
+    return summary
+
+
+def train(data_path, grid=DEFAULT_GRID, scoring='f1_macro', folds=5, workers=1,
+          test_size=0.2, split_seed=10, random_state=0):
+    """Run the full training; returns (model, scaler, metadata)."""
+    X, y = load_data(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=split_seed)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    start = time.perf_counter()
+    cv_results = cross_validate(X_train_scaled, y_train, grid, scoring, folds, workers, random_state)
+    cv_seconds = time.perf_counter() - start
+    # Highest mean score; ties go to the smaller forest, as in GridSearchCV
+    best = max(sorted(cv_results), key=lambda n: cv_results[n]['mean_score'])
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=best, random_state=random_state, n_jobs=workers)
+    model.fit(X_train_scaled, y_train)
+    # Predictions are the same for any n_jobs; don't carry the training setting into serving
+    model.set_params(n_jobs=None)
+    refit_seconds = time.perf_counter() - start
+
+    predicted = model.predict(X_test_scaled)
+    metadata = {
+        'data': os.path.basename(data_path),
+        'data_sha256': file_digest(data_path),
+        'rows': int(len(X)),
+        'scoring': scoring,
+        'best_params': {'n_estimators': int(best)},
+        'cv_results': {str(n): result for n, result in cv_results.items()},
+        'test_metrics': {
+            'mean_absolute_error': round(float(mean_absolute_error(y_test, predicted)), 3),
+            'f1_macro': round(float(f1_score(y_test, predicted, average='macro')), 3),
+            'accuracy': round(float(accuracy_score(y_test, predicted)), 3),
+        },
+        'cv_seconds': round(cv_seconds, 3),
+        'refit_seconds': round(refit_seconds, 3),
+        'settings': {'folds': folds, 'workers': workers, 'test_size': test_size,
+                     'split_seed': split_seed, 'random_state': random_state},
+        'sklearn_version': sklearn.__version__,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    return model, scaler, metadata
+
+
+def _atomic_copy(src, dst):
+    tmp = f'{dst}.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def save(model, scaler, metadata, models_dir='models'):
+    """Write the artifacts to a new version directory and return its path."""
+    staging = os.path.join(models_dir, f'.staging-{os.getpid()}')
+    os.makedirs(staging, exist_ok=True)
+    model_path = os.path.join(staging, 'model.pkl')
+    scaler_path = os.path.join(staging, 'scaler.pkl')
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    with open(scaler_path, 'wb') as f:
+        pickle.dump(scaler, f)
+
+    # Same combined hash the app reports as the model version
+    digest = hashlib.sha256()
+    digest.update(file_digest(model_path).encode())
+    digest.update(file_digest(scaler_path).encode())
+    metadata = dict(metadata, version=digest.hexdigest()[:16])
+    with open(os.path.join(staging, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    target = os.path.join(models_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{metadata['version']}")
+    os.replace(staging, target)
+    return target
+
+
+def publish(version_dir, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """Make ``version_dir`` the served model.
+
+    The pair is replaced file by file, so the version it makes up is written
+    to ``model.json`` first; the app does not load a model/scaler pair until
+    it matches that version.  When a compiled ``.forest`` model is served,
+    the pickles go to ``model.pkl`` and the compiled model is re-exported
+    from them.
+    """
+    compiled = model_path.endswith(COMPILED_SUFFIX)
+    pickle_path = 'model.pkl' if compiled else model_path
+    _atomic_copy(os.path.join(version_dir, 'metadata.json'), os.path.splitext(pickle_path)[0] + '.json')
+    _atomic_copy(os.path.join(version_dir, 'scaler.pkl'), scaler_path)
+    _atomic_copy(os.path.join(version_dir, 'model.pkl'), pickle_path)
+    if compiled:
+        from export_model import export
+
+        report = export(pickle_path, scaler_path, model_path)
+        failed = [name for name, _, mismatches in report if mismatches]
+        if failed:
+            raise RuntimeError(f"{model_path} not updated: folded model mismatched on {', '.join(failed)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Random Forest and write versioned artifacts.")
+    parser.add_argument('--data', default='labelled_dysx.csv')
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=DEFAULT_GRID, help="Grid of forest sizes")
+    parser.add_argument('--scoring', default='f1_macro')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--publish', action='store_true', help="Also replace the served model.pkl and scaler.pkl")
+    args = parser.parse_args(argv)
+
+    model, scaler, metadata = train(args.data, args.n_estimators, args.scoring, args.folds, args.workers)
+    for n, result in metadata['cv_results'].items():
+        print(f"n_estimators={n:>5}: {args.scoring} {result['mean_score']:.3f} "
+              f"(+/- {result['std_score']:.3f})")
+    print('Best value of n_estimators for RandomForest model is:', metadata['best_params'])
+    print('Metrics on Test Set:')
+    print(f"Mean Absolute Error: {metadata['test_metrics']['mean_absolute_error']}")
+    print(f"F1 Score: {metadata['test_metrics']['f1_macro']}")
+    print(f"Accuracy: {metadata['test_metrics']['accuracy']}")
+    print(f"Cross-validation {metadata['cv_seconds']:.1f}s, refit {metadata['refit_seconds']:.1f}s")
+
+    version_dir = save(model, scaler, metadata, args.models_dir)
+    print(f"Wrote {version_dir}")
+    if args.publish:
+        publish(version_dir)
+        print(f"Published to {MODEL_PATH} and {SCALER_PATH}")
+
+
+if __name__ == '__main__':
+    main()